@@ -11,3 +11,11 @@ tvdb_apikey = config["tvdb_apikey"]
 x_plex_token = config["x_plex_token"]
 plex_address = config.get("plex_address", "localhost")
 plex_port = config.get("plex_port", "32400")
+plex_url = config.get("plex_url", "")  # overrides plex_address/plex_port, e.g. http://127.0.0.1:32400
+ingestion = config.get("ingestion", "events")  # "events" (notification stream) or "polling"
+cache_ttl = config.get("cache_ttl", {})  # seconds per cache namespace, e.g. {"cover_tv": 604800}
+rate_limits = config.get("rate_limits", {})  # requests per second per provider, e.g. {"musicbrainz": 1}
+provider_urls = config.get("provider_urls", {})  # base URL per provider, e.g. {"tvdb": "http://127.0.0.1:32501/v4"}
+record_sessions = config.get("record_sessions", "")  # file to record /status/sessions to, e.g. sessions.jsonl.gz
+poll_interval = config.get("poll_interval", 60)  # seconds between Plex polls while playing, the position being extrapolated in between
+drift_threshold = config.get("drift_threshold", 10)  # seconds the reported position may drift from the extrapolated one before a resync
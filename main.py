@@ -1,280 +1,538 @@
+import asyncio
 import time
 import json
 import subprocess
 
-from config import client_id
+from concurrent.futures import ThreadPoolExecutor
+
+from config import client_id, ingestion, record_sessions, poll_interval, drift_threshold
 from socket import error as SocketError
 
 from utils.logger import setup_logger
-from utils.art import get_item_cover, get_artist_picture
-from utils import plex
+from utils.art import get_item_cover, get_artist_picture, resolve_artworks
+from utils import http, plex
+from utils.notifications import PlexEventSource
+from utils.scheduler import PresenceScheduler
+from utils.reconnect import Backoff, IpcWatcher
+from utils.fanout import FanoutPresence
+from utils.recording import SessionRecorder
+from utils.playback import PlaybackTracker, Action, Transition, TRANSITION_ACTIONS
+from utils.polling import PollScheduler
+from utils.timers import TimerQueue
+from utils.session import PlaybackSession
 
 # from pypresence import Presence
 # from pypresence import PyPresenceException
-from patchedPypresence.presence import Presence, Activity, StatusDisplay
-from patchedPypresence.exceptions import PyPresenceException
+from patchedPypresence.presence import Activity, StatusDisplay
+from patchedPypresence.exceptions import DiscordNotFound, PyPresenceException, ServerError
 
-RPC = Presence(client_id)
 LOGGER = setup_logger(__name__)
+NOTIFICATIONS_RESYNC = 300  # seconds without notification before a full resync
+ARTWORK_GRACE = 0.2  # seconds to wait for artwork before publishing text only
+UPDATE_BUDGET = 5  # seconds an update may spend resolving artwork before giving up
+END_GRACE = 5  # seconds a media may still be reported past its predicted end before clearing its presence
+STATS_INTERVAL = 3600  # seconds between two summaries of the requests to Plex and the providers
+ARTWORK_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="artwork")
 
 
-def main():
-    try:
-        RPC.connect()
-    except PyPresenceException as error:
-        LOGGER.error(f"❌ Failed to connect to Discord: {error}")
-        reconnect_to_discord()
-    except SocketError as error:
-        if error.errno == 104:
-            LOGGER.error(f"❌ Connection reset by peer: {error}")
-            reconnect_to_discord()
-        else:
-            LOGGER.error(f"❌ Failed to connect to Discord: {error}")
-            reconnect_to_discord()
-    except Exception as error:
-        LOGGER.error(f"❌ Got an unexpected error: {error}")
-        exit(1)
+class Pipeline:
+    """State shared by the Plex poller, the artwork resolvers and the Discord writer"""
+
+    def __init__(self, rpc: FanoutPresence):
+        self.rpc = rpc
+        self.scheduler = PresenceScheduler()
+        self.artwork_task: asyncio.Task | None = None
+        self.artwork = {}  # artwork resolved for the media playing
+        self.presence = {}  # presence of the media playing, without artwork
+
+    def send(self, to_send: dict | None):
+        """Hands a presence to the Discord writer, replacing any presence not written yet
+
+        Args:
+            to_send (dict | None): Informations to send to discord RPC, None to clear the presence
+        """
+        self.scheduler.submit(to_send)
+
+    def present(self, to_send: dict):
+        """Hands the presence of the media playing, with the artwork resolved for it so far
+
+        Args:
+            to_send (dict): Informations to send to discord RPC, with placeholder images
+        """
+        self.presence = to_send
+        self.send(with_artwork(to_send, self.artwork))
+
+    def cancel_artwork(self):
+        """Drops the artwork update of the previous media, if still resolving"""
+        if self.artwork_task:
+            self.artwork_task.cancel()
+            self.artwork_task = None
+
+
+async def main():
+    rpc = FanoutPresence(client_id, loop=asyncio.get_running_loop())
+    pipeline = Pipeline(rpc)
+
+    if record_sessions:
+        plex.add_activity_hook(SessionRecorder(record_sessions))
 
-    precedent_activity = {}
-    precedent_start = 0
-    to_send = {}
+    events = None
+    if ingestion == "events":
+        events = PlexEventSource()
+        events.start()
 
     LOGGER.info("🚀 Discord Plex RPC launched, waiting for Plex Activity...")
 
+    await asyncio.gather(
+        write_discord(pipeline),
+        poll_plex(pipeline, events),
+    )
+
+
+async def poll_plex(pipeline: Pipeline, events: PlexEventSource | None):
+    """Follows Plex activity and hands the presence to publish to the pipeline
+
+    Args:
+        pipeline (Pipeline): Pipeline to feed
+        events (PlexEventSource | None): Notification listener, None when polling only
+    """
+    loop = asyncio.get_running_loop()
+    tracker = PlaybackTracker(drift_threshold=drift_threshold)
+    polling = PollScheduler(poll_interval=poll_interval)
+    timers = TimerQueue()
+    timers.schedule("stats", STATS_INTERVAL)
+    ended = None  # playback whose presence was cleared at its end
+
     while True:
         try:
-            current_activity = plex.get_my_activity()
+            fired = timers.pop_due()
+            if "stats" in fired:
+                http.log_request_stats()
+                timers.schedule("stats", STATS_INTERVAL)
+            if events and events.connected:
+                current_activity = events.get_activity()
+            else:
+                current_activity = await loop.run_in_executor(None, plex.get_my_activity)
             #print(json.dumps(current_activity, indent=2))
-            if current_activity:
-                # Only update if there's a significant change in activity
-                should_update = not (
-                    precedent_activity
-                    and precedent_activity["title"] == precedent_activity["title"]
-                    and precedent_activity["Player"]["state"]
-                    == current_activity["Player"]["state"]
-                    and abs(
-                        int(current_activity["viewOffset"] / 1000) - precedent_start
-                    )
-                    < 15
+            session = PlaybackSession.from_plex(current_activity) if current_activity else None
+            transition = tracker.observe(session)
+            action = TRANSITION_ACTIONS[transition]
+
+            if (
+                "overrun" in fired
+                and transition is Transition.UNCHANGED
+                and tracker.state == "playing"
+                and tracker.remaining() <= 0
+            ):
+                # Still reported well past its end, don't let the timestamps count past zero
+                LOGGER.info("⏹️ Media ended, clearing the presence")
+                ended = tracker.key
+                action = Action.CLEAR
+            elif ended and action is Action.PROGRESS and tracker.remaining() <= END_GRACE:
+                action = Action.NONE
+            elif action in (Action.REBUILD, Action.PROGRESS):
+                # Shown again (e.g. seeked back), its end timers are armed below
+                ended = None
+            LOGGER.debug(f"Playback {transition.value}, presence update: {action.value}")
+
+            if action in (Action.REBUILD, Action.PROGRESS):
+                LOGGER.info(
+                    session.state.capitalize()
+                    + " - "
+                    + session.grandparent_title
+                    + " - "
+                    + session.parent_title
+                    + " - "
+                    + session.title
                 )
 
-                if should_update:
-                    to_send = get_corresponding_infos(current_activity=current_activity)
-                    if (
-                        current_activity.get("grandparentTitle", "") != ""
-                        and not current_activity["type"] == "track"
-                    ):
-                        to_send["details"] = current_activity["grandparentTitle"]
-
-                    LOGGER.info(
-                        current_activity["Player"]["state"].capitalize()
-                        + " - "
-                        + current_activity.get("grandparentTitle", "")
-                        + " - "
-                        + current_activity.get("parentTitle", "")
-                        + " - "
-                        + current_activity["title"]
-                    )
-                    RPC.update(**to_send)
-
-                # Update precedent activity
-                precedent_activity = current_activity
-                precedent_start = int(current_activity["viewOffset"] / 1000)
+            if action is Action.REBUILD:
+                deadline = time.monotonic() + UPDATE_BUDGET
+                await publish(
+                    pipeline=pipeline,
+                    to_send=get_corresponding_infos(session=session),
+                    session=session,
+                    deadline=deadline,
+                )
+            elif action is Action.PROGRESS:
+                # Same media, the artwork already resolved still applies
+                pipeline.present(get_corresponding_infos(session=session))
+            elif action is Action.CLEAR:
+                pipeline.cancel_artwork()
+                pipeline.send(None)
+
+            if action is not Action.NONE:
+                # Started, paused, seeked...: the predicted end moved
+                timers.cancel("end", "overrun")
+                if tracker.state == "playing" and not ended:
+                    timers.schedule("end", max(0, tracker.remaining()))
+            elif "end" in fired:
+                # Plex may take a few seconds to move on to the next item
+                timers.schedule("overrun", END_GRACE)
+
+            await wait_for_activity(
+                events=events,
+                delay=polling.next_delay(tracker, transition),
+                wake_up=timers.timeout(),
+            )
+        except Exception as error:
+            LOGGER.error(f"❌ Encountered an unexpected error : {error}")
+            # Start over from the next activity seen
+            tracker = PlaybackTracker(drift_threshold=drift_threshold)
+            timers = TimerQueue()
+            timers.schedule("stats", STATS_INTERVAL)
+            ended = None
+            await asyncio.sleep(10)
+
+
+async def write_discord(pipeline: Pipeline):
+    """Writes the presences scheduled by the pipeline to Discord, reconnecting when needed
+
+    Args:
+        pipeline (Pipeline): Pipeline to write from
+    """
+    await connect_to_discord(pipeline.rpc)
+
+    while True:
+        to_send = await pipeline.scheduler.next()
+        try:
+            if to_send is None:
+                await pipeline.rpc.clear()
             else:
-                RPC.clear()
-                precedent_activity = {}
-                precedent_start = 0
-
-            time.sleep(5 if current_activity else 10)
-        except PyPresenceException as pypresence_error:
-            LOGGER.error(f"❌ Got a PyPresence error: {pypresence_error}")
-            reconnect_to_discord()
-        except SocketError as error:
-            if error.errno == 104:
+                await pipeline.rpc.update(**to_send)
+            pipeline.scheduler.sent(to_send)
+        except ServerError as error:
+            # The connection is fine, writing the same presence again would fail the same way
+            LOGGER.error(f"❌ Discord rejected the presence: {error}")
+            pipeline.scheduler.reset()
+        except (PyPresenceException, SocketError) as error:
+            if isinstance(error, SocketError) and error.errno == 104:
                 LOGGER.error(f"❌ Connection reset by peer: {error}")
             else:
-                LOGGER.error(f"❌ Failed to connect to Discord: {error}")
-            reconnect_to_discord()
+                LOGGER.error(f"❌ Got a Discord error: {error}")
+            await connect_to_discord(pipeline.rpc, reconnect=True)
+            # Write the latest presence again on the new connection
+            pipeline.scheduler.retry(to_send)
         except Exception as error:
             LOGGER.error(f"❌ Encountered an unexpected error : {error}")
-            time.sleep(10)
+            pipeline.scheduler.reset()
+
 
+async def connect_to_discord(rpc: FanoutPresence, reconnect: bool = False):
+    """Infinite loop until connected to Discord client
 
-def reconnect_to_discord():
-    """Infinite loop until connected to Discord client"""
-    LOGGER.warning("⚠️ Attempting to reconnect to Discord")
+    Retries with a capped exponential backoff, right away when a Discord IPC socket appears.
+
+    Args:
+        rpc (FanoutPresence): Discord RPC clients
+        reconnect (bool, optional): True if the connection was lost. Defaults to False.
+    """
+    if reconnect:
+        LOGGER.warning("⚠️ Attempting to reconnect to Discord")
 
+    backoff = Backoff()
+    watcher = None
     while True:
         try:
-            RPC.connect()
+            await rpc.connect()
             break
-        except PyPresenceException as reconnect_error:
-            LOGGER.error(f"❌ Failed to reconnect to Discord: {reconnect_error}")
-        except SocketError as socker_error:
-            if socker_error.errno == 104:
-                LOGGER.error(f"❌ Connection reset by peer: {socker_error}")
+        except DiscordNotFound:
+            if backoff.attempts == 0:
+                LOGGER.error("❌ Discord is not running, waiting for it")
+        except PyPresenceException as connect_error:
+            LOGGER.error(f"❌ Failed to connect to Discord: {connect_error}")
+        except SocketError as socket_error:
+            if socket_error.errno == 104:
+                LOGGER.error(f"❌ Connection reset by peer: {socket_error}")
             else:
                 LOGGER.error(
-                    f"❌ Got a socket error while connecting to Discord client: {socker_error}"
+                    f"❌ Got a socket error while connecting to Discord client: {socket_error}"
                 )
-            LOGGER.warning("⚠️ Retrying in 30 seconds")
-            time.sleep(30)
         except Exception as error:
-            LOGGER.error(f"❌ Unexpected error while reconnecting to Discord: {error}")
-            LOGGER.warning("⚠️ Retrying in 30 seconds")
-            time.sleep(30)
+            LOGGER.error(f"❌ Unexpected error while connecting to Discord: {error}")
+        if watcher is None:
+            watcher = IpcWatcher()
+        delay = backoff.next()
+        LOGGER.debug(f"Retrying to connect to Discord in {delay:.1f} seconds")
+        if await watcher.wait(delay):
+            LOGGER.info("🔌 Discord IPC socket appeared, connecting")
+
+    if watcher is not None:
+        watcher.close()
+    if reconnect:
+        LOGGER.info("✔️ Reconnected successfully to Discord")
+
+
+async def publish(
+    pipeline: Pipeline, session: PlaybackSession, to_send: dict, deadline: float
+):
+    """Publishes the presence right away, the artwork following in a second update if it's slow to resolve
+
+    Args:
+        pipeline (Pipeline): Pipeline to publish to
+        session (PlaybackSession): Current activity provided by Plex
+        to_send (dict): Informations to send to discord RPC, with placeholder images
+        deadline (float): time.monotonic() after which missing artwork is given up
+    """
+    pipeline.cancel_artwork()
+    pipeline.artwork = {}
+
+    job = asyncio.get_running_loop().run_in_executor(
+        ARTWORK_POOL, get_artwork, session, deadline
+    )
+    try:
+        artwork = await asyncio.wait_for(asyncio.shield(job), ARTWORK_GRACE)
+    except asyncio.TimeoutError:
+        pipeline.present(to_send)
+        pipeline.artwork_task = asyncio.create_task(send_artwork(pipeline=pipeline, job=job))
+        return
+    except Exception as error:
+        LOGGER.error(f"❌ Failed to get artwork: {error}")
+        artwork = {}
+
+    pipeline.artwork = artwork
+    pipeline.present(to_send)
 
-    LOGGER.info("✔️ Reconnected successfully to Discord")
 
+async def send_artwork(pipeline: Pipeline, job: asyncio.Future):
+    """Publishes the presence again with its artwork, cancelled if the media changes first
 
-def get_corresponding_infos(current_activity: dict) -> dict:
+    Args:
+        pipeline (Pipeline): Pipeline to publish to
+        job (asyncio.Future): Artwork resolution
+    """
+    try:
+        artwork = await job
+    except Exception as error:
+        LOGGER.error(f"❌ Failed to get artwork: {error}")
+        return
+
+    if artwork:
+        pipeline.artwork = artwork
+        # The latest presence, the playback may have been paused or seeked meanwhile
+        pipeline.present(pipeline.presence)
+
+
+async def wait_for_activity(
+    events: PlexEventSource | None, delay: float, wake_up: float | None
+):
+    """Waits until the next Plex check, woken up early by Plex notifications if available
+
+    Args:
+        events (PlexEventSource | None): Notification listener, None when polling only
+        delay (float): Seconds before the next poll when not listening to notifications
+        wake_up (float | None): Seconds before a timer needs a fresh look at Plex, None if none is scheduled
+    """
+    loop = asyncio.get_running_loop()
+    if events and events.connected:
+        timeout = NOTIFICATIONS_RESYNC if wake_up is None else min(NOTIFICATIONS_RESYNC, wake_up)
+        if not await loop.run_in_executor(None, events.wait, timeout):
+            await loop.run_in_executor(None, events.refresh)
+    else:
+        await asyncio.sleep(delay if wake_up is None else min(delay, wake_up))
+
+
+def get_corresponding_infos(session: PlaybackSession) -> dict:
     """Returns informations corresponding to the media if it's a show/movie/song or others
 
     Args:
-        current_activity (dict): Current activity provided by Plex
+        session (PlaybackSession): Current activity provided by Plex
 
     Returns:
         dict: Dict with the informations to send to discord RPC
     """
-    match current_activity["type"]:
+    match session.type:
         case "episode":
-            to_send = parse_episode(current_activity)
+            to_send = parse_episode(session)
         case "movie":
-            to_send = parse_movie(current_activity)
+            to_send = parse_movie(session)
         case "track":
-            to_send = parse_track(current_activity)
+            to_send = parse_track(session)
         case _:
-            to_send = dict(state=current_activity["title"])
+            to_send = dict(state=session.title)
             to_send["large_image"] = "plex"
             to_send["activity_type"] = Activity.PLAYING.value
             to_send["status_display_type"] = StatusDisplay.NAME.value
 
-    to_send = set_progress(current_activity=current_activity, to_send=to_send)
+    if session.grandparent_title != "" and not session.type == "track":
+        to_send["details"] = session.grandparent_title
+
+    to_send = set_progress(session=session, to_send=to_send)
 
     return to_send
 
 
-def parse_episode(current_activity: dict) -> dict:
+def parse_episode(session: PlaybackSession) -> dict:
     """Parse infos for an episode
 
     Args:
-        current_activity (dict): Current activity provided by Plex
+        session (PlaybackSession): Current activity provided by Plex
         to_send (dict): informations that'll be sent to discord RPC to set progression
 
     Returns:
         dict: Updated to_send dict with the parsed episode's info
     """
-    to_send = dict(
-        state="S"
-        + str(current_activity["parentIndex"])
-        + "・E"
-        + str(current_activity["index"])
-        + " - "
-        + current_activity["title"]
-    )
-
-    artwork = get_item_cover(
-        plex_item_id=current_activity["grandparentRatingKey"],
-        media_type="tv",
+    # Plex leaves out the season or episode number of some specials
+    numbering = "・".join(
+        f"{prefix}{number}"
+        for prefix, number in [("S", session.parent_index), ("E", session.index)]
+        if number is not None
     )
+    to_send = dict(state=f"{numbering} - {session.title}" if numbering else session.title)
 
-    to_send["large_image"] = artwork if artwork else "show"
-    to_send["large_text"] = current_activity["grandparentTitle"][:50]
+    to_send["large_image"] = "show"
+    to_send["large_text"] = session.grandparent_title[:50]
     to_send["activity_type"] = Activity.WATCHING.value
     to_send["status_display_type"] = StatusDisplay.DETAILS.value
 
     return to_send
 
 
-def parse_movie(current_activity: dict) -> dict:
+def parse_movie(session: PlaybackSession) -> dict:
     """Parse infos for a movie
 
     Args:
-        current_activity (dict): Current activity provided by Plex
+        session (PlaybackSession): Current activity provided by Plex
         to_send (dict): informations that'll be sent to discord RPC to set progression
 
     Returns:
         dict: Updated to_send dict with the parsed movie's info
     """
-    artwork = get_item_cover(
-        plex_item_id=current_activity["ratingKey"],
-        media_type="movies",
-    )
-
-    to_send = dict(details=current_activity["title"])
-    to_send["state"] = str(current_activity["year"])
-    to_send["large_image"] = artwork if artwork else "movie"
-    to_send["large_text"] = current_activity["title"][:50]
+    to_send = dict(details=session.title)
+    if session.year is not None:
+        to_send["state"] = str(session.year)
+    to_send["large_image"] = "movie"
+    to_send["large_text"] = session.title[:50]
     to_send["activity_type"] = Activity.WATCHING.value
     to_send["status_display_type"] = StatusDisplay.DETAILS.value
 
     return to_send
 
 
-def parse_track(current_activity: dict) -> dict:
+def parse_track(session: PlaybackSession) -> dict:
     """Parse infos for a track
     Args:
-        current_activity (dict): Current activity provided by Plex
+        session (PlaybackSession): Current activity provided by Plex
         to_send (dict): informations that'll be sent to discord RPC to set progression
 
     Returns:
         dict: Updated to_send dict with the parsed track's info
     """
     artists = (
-        current_activity["title"]
-        if current_activity["title"]
-        else current_activity["grandparentTitle"]
+        session.title
+        if session.title
+        else session.grandparent_title
     )
 
     to_send = dict(state=artists)
+    to_send["large_image"] = "music"
+    to_send["small_image"] = "play"
+    to_send["small_text"] = "Playing"
 
-    artwork = get_item_cover(
-        media_name=current_activity["parentTitle"],
-        media_type="music",
-        media_artist=current_activity["grandparentTitle"],
-    )
-
-    to_send["large_image"] = artwork if artwork else "music"
-    artist_pic_url = get_artist_picture(current_activity["grandparentTitle"])
-
-    if artist_pic_url:
-        to_send["small_image"] = artist_pic_url
-        to_send["small_text"] = current_activity["grandparentTitle"]
-    else:
-        to_send["small_image"] = "play"
-        to_send["small_text"] = "Playing"
-
-    to_send["details"] = current_activity["title"][:50]
-    to_send["large_text"] = "{:<2}".format(current_activity["parentTitle"])
+    to_send["details"] = session.title[:50]
+    to_send["large_text"] = "{:<2}".format(session.parent_title)
     to_send["activity_type"] = Activity.LISTENING.value
     to_send["status_display_type"] = StatusDisplay.STATE.value
 
     return to_send
 
 
-def set_progress(current_activity: dict, to_send: dict) -> dict:
+def get_artwork(session: PlaybackSession, deadline: float) -> dict:
+    """Resolves the artwork of the media, may take a while on a cold cache
+
+    Args:
+        session (PlaybackSession): Current activity provided by Plex
+        deadline (float): time.monotonic() after which missing artwork is given up
+
+    Returns:
+        dict: Images to send to discord RPC in place of the placeholders, empty if none found
+    """
+    match session.type:
+        case "episode":
+            needs = dict(
+                cover=(
+                    get_item_cover,
+                    dict(
+                        plex_item_id=session.grandparent_rating_key,
+                        media_type="tv",
+                    ),
+                )
+            )
+        case "movie":
+            needs = dict(
+                cover=(
+                    get_item_cover,
+                    dict(plex_item_id=session.rating_key, media_type="movies"),
+                )
+            )
+        case "track":
+            needs = dict(
+                cover=(
+                    get_item_cover,
+                    dict(
+                        media_name=session.parent_title,
+                        media_type="music",
+                        media_artist=session.grandparent_title,
+                    ),
+                ),
+                artist=(
+                    get_artist_picture,
+                    dict(artist_name=session.grandparent_title),
+                ),
+            )
+        case _:
+            return {}
+
+    resolved = resolve_artworks(needs, timeout=max(0, deadline - time.monotonic()))
+
+    artwork = {}
+    if resolved.get("cover"):
+        artwork["large_image"] = resolved["cover"]
+    if resolved.get("artist"):
+        artwork["small_image"] = resolved["artist"]
+        artwork["small_text"] = session.grandparent_title
+    return artwork
+
+
+def with_artwork(to_send: dict, artwork: dict) -> dict:
+    """Replaces the placeholder images of a presence with the artwork of its media
+
+    Args:
+        to_send (dict): Informations to send to discord RPC, with placeholder images
+        artwork (dict): Images returned by get_artwork
+
+    Returns:
+        dict: Informations to send to discord RPC
+    """
+    if to_send.get("small_image") == "pause":
+        # The pause icon takes precedence over the artist picture
+        artwork = {key: value for key, value in artwork.items() if not key.startswith("small_")}
+    return {**to_send, **artwork}
+
+
+def set_progress(session: PlaybackSession, to_send: dict) -> dict:
     """Set the duration of the media as a timestamp if playing or paused if not
 
     Args:
-        current_activity (dict): Current activity provided by Plex
+        session (PlaybackSession): Current activity provided by Plex
         to_send (dict): Informations that'll be sent to discord RPC to set progression
 
     Returns:
         dict: Updated to_send dict with the media progression
     """
-    if current_activity["Player"]["state"] == "playing":
-        duration = int(current_activity["duration"]) / 1000
+    if session.state == "playing":
+        duration = session.duration / 1000
         current_time = int(time.time())
-        current_progress = int(current_activity["viewOffset"]) / 1000
+        current_progress = session.view_offset / 1000
         to_send["start"] = current_time - current_progress
         to_send["end"] = current_time + (duration - current_progress)
         # to_send["small_image"] = "play"
         # to_send["small_text"] = "Playing"
-    elif current_activity["Player"]["state"] == "paused":
+    elif session.state == "paused":
         to_send["small_image"] = "pause"
         to_send["small_text"] = "Paused"
     return to_send
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,6 +1,5 @@
 import asyncio
 import inspect
-import json
 import os
 import struct
 import sys
@@ -10,7 +9,10 @@ from typing import Union, Optional
 # TODO: Get rid of this import * lol
 from .exceptions import *
 from .payloads import Payload
-from .utils import get_ipc_path, get_event_loop
+from .utils import get_ipc_path, get_event_loop, json_dumps, json_loads, remember_ipc_path
+
+# Frame header: opcode and payload length, little endian
+HEADER = struct.Struct('<II')
 
 
 class BaseClient:
@@ -19,6 +21,7 @@ class BaseClient:
         loop = kwargs.get('loop', None)
         handler = kwargs.get('handler', None)
         self.pipe = kwargs.get('pipe', None)
+        self.ipc_path = kwargs.get('ipc_path', None)
         self.isasync = kwargs.get('isasync', False)
         self.connection_timeout = kwargs.get('connection_timeout', 30)
         self.response_timeout = kwargs.get('response_timeout', 10)
@@ -55,10 +58,10 @@ class BaseClient:
             loop.set_exception_handler(err_handler)
             self.handler = handler
 
-        if getattr(self, "on_event", None):  # Tasty bad code ;^)
-            self._events_on = True
-        else:
-            self._events_on = False
+        # Responses are matched to their command by nonce by a single reader task
+        self._responses: dict = {}
+        self._output_waiters = []
+        self._reader_task: Optional[asyncio.Task] = None
 
     def update_event_loop(self, loop):
         # noinspection PyAttributeOutsideInit
@@ -74,16 +77,116 @@ class BaseClient:
     async def _async_err_handle(self, loop, context: dict):
         await self.handler(context['exception'], context['future'])
 
+    def _close_writer(self):
+        # Drop the transport of a previous connection before opening a new one
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        self._fail_waiters(PipeClosed())
+        if self.sock_writer is not None:
+            self.sock_writer.close()
+            self.sock_writer = None
+            self.sock_reader = None
+
+    def _fail_waiters(self, error: Exception):
+        waiters = list(self._responses.values()) + self._output_waiters
+        self._responses.clear()
+        self._output_waiters.clear()
+        for future in waiters:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _read_loop(self):
+        error = PipeClosed()
+        try:
+            while True:
+                status_code, data = await self.read_frame()
+                self._dispatch(json_loads(data))
+        except (BrokenPipeError, ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            error = e
+        finally:
+            self._fail_waiters(error)
+
+    def _dispatch(self, payload: dict):
+        future = self._responses.pop(payload.get("nonce"), None)
+        if future is not None:
+            if future.done():
+                return
+            if payload.get("evt") == "ERROR":
+                future.set_exception(ServerError(payload["data"]["message"]))
+            else:
+                future.set_result(payload)
+            return
+
+        evt = (payload.get("evt") or "").lower()
+        handler = getattr(self, "_events", {}).get(evt)
+        if handler is not None:
+            result = handler(payload["data"])
+            if inspect.iscoroutine(result):
+                self.loop.create_task(result)
+            return
+
+        if self._output_waiters:
+            future = self._output_waiters.pop(0)
+            if not future.done():
+                future.set_result(payload)
+        elif evt == 'error':
+            self.loop.call_exception_handler({
+                'message': 'Discord sent an error event',
+                'exception': DiscordError(payload["data"]["code"], payload["data"]["message"]),
+                'future': None,
+            })
+
+    def send_command(self, payload: Union[dict, Payload], op: int = 1) -> asyncio.Future:
+        """Sends a command without waiting, the returned future resolves with its response.
+        Several commands can be in flight at once."""
+        if self._reader_task is not None and self._reader_task.done():
+            raise PipeClosed
+        data = payload.data if isinstance(payload, Payload) else payload
+        self.send_data(op, data)
+        # Registered once written, the response can't be read before we yield to the loop
+        future = self.loop.create_future()
+        nonce = data.get("nonce")
+        if nonce is not None:
+            self._responses[nonce] = future
+        else:
+            self._output_waiters.append(future)
+        return future
+
+    async def wait_response(self, future: asyncio.Future):
+        """Waits for the response of a command sent with send_command"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.response_timeout)
+        except asyncio.TimeoutError:
+            for nonce, pending in list(self._responses.items()):
+                if pending is future:
+                    del self._responses[nonce]
+            raise ResponseTimeout
+
+    async def request(self, payload: Union[dict, Payload], op: int = 1):
+        """Sends a command and waits for its response"""
+        return await self.wait_response(self.send_command(payload, op))
+
+    async def read_frame(self):
+        preamble = await self.sock_reader.readexactly(HEADER.size)
+        status_code, length = HEADER.unpack(preamble)
+        return status_code, await self.sock_reader.readexactly(length)
+
     async def read_output(self):
+        if self._reader_task is not None:
+            # The reader task owns the socket, wait for the next frame nobody claimed
+            future = self.loop.create_future()
+            self._output_waiters.append(future)
+            return await self.wait_response(future)
         try:
-            preamble = await asyncio.wait_for(self.sock_reader.read(8), self.response_timeout)
-            status_code, length = struct.unpack('<II', preamble[:8])
-            data = await asyncio.wait_for(self.sock_reader.read(length), self.response_timeout)
-        except (BrokenPipeError, struct.error):
+            status_code, data = await asyncio.wait_for(self.read_frame(), self.response_timeout)
+        except (BrokenPipeError, ConnectionResetError, asyncio.IncompleteReadError):
             raise PipeClosed
         except asyncio.TimeoutError:
             raise ResponseTimeout
-        payload = json.loads(data.decode('utf-8'))
+        payload = json_loads(data)
         if payload["evt"] == "ERROR":
             raise ServerError(payload["data"]["message"])
         return payload
@@ -91,19 +194,15 @@ class BaseClient:
     def send_data(self, op: int, payload: Union[dict, Payload]):
         if isinstance(payload, Payload):
             payload = payload.data
-        payload = json.dumps(payload)
+        data = json_dumps(payload)
 
         assert self.sock_writer is not None, "You must connect your client before sending events!"
 
-        self.sock_writer.write(
-            struct.pack(
-                '<II',
-                op,
-                len(payload)) +
-            payload.encode('utf-8'))
+        # Header and payload are handed to the transport separately, no concatenation copy
+        self.sock_writer.writelines((HEADER.pack(op, len(data)), data))
 
     async def handshake(self):
-        ipc_path = get_ipc_path(self.pipe)
+        ipc_path = self.ipc_path or get_ipc_path(self.pipe)
         if not ipc_path:
             raise DiscordNotFound
 
@@ -120,12 +219,16 @@ class BaseClient:
             raise ConnectionTimeout
 
         self.send_data(0, {'v': 1, 'client_id': self.client_id})
-        preamble = await self.sock_reader.read(8)
-        code, length = struct.unpack('<ii', preamble)
-        data = json.loads(await self.sock_reader.read(length))
+        try:
+            code, data = await asyncio.wait_for(self.read_frame(), self.response_timeout)
+        except asyncio.IncompleteReadError:
+            raise PipeClosed
+        except asyncio.TimeoutError:
+            raise ResponseTimeout
+        data = json_loads(data)
         if 'code' in data:
             if data['message'] == 'Invalid Client ID':
                 raise InvalidID
             raise DiscordError(data['code'], data['message'])
-        if self._events_on:
-            self.sock_reader.feed_data = self.on_event
+        remember_ipc_path(ipc_path)
+        self._reader_task = self.loop.create_task(self._read_loop())
@@ -7,6 +7,8 @@ from .utils import remove_none
 
 
 class Payload:
+    _last_time = 0.0
+
     def __init__(self, data, clear_none=True):
         if clear_none:
             data = remove_none(data)
@@ -15,9 +17,11 @@ class Payload:
     def __str__(self):
         return json.dumps(self.data, indent=2)
 
-    @staticmethod
-    def time():
-        return time.time()
+    @classmethod
+    def time(cls):
+        # Nonces must stay unique while several commands are awaiting their response
+        cls._last_time = max(time.time(), cls._last_time + 1e-6)
+        return cls._last_time
 
     @classmethod
     def set_activity(
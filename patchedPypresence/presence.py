@@ -70,21 +70,22 @@ class Presence(BaseClient):
             )
         else:
             payload = payload_override
-        self.send_data(1, payload)
-        return self.loop.run_until_complete(self.read_output())
+        return self.loop.run_until_complete(self.request(payload))
 
     def clear(self, pid: int = os.getpid()):
         payload = Payload.set_activity(pid, activity=None)
-        self.send_data(1, payload)
-        return self.loop.run_until_complete(self.read_output())
+        return self.loop.run_until_complete(self.request(payload))
 
     def connect(self):
-        self.update_event_loop(get_event_loop())
+        # Reuse the loop across reconnects, a fresh one is only needed once closed
+        if self.loop.is_closed():
+            self.update_event_loop(get_event_loop(force_fresh=True))
+        self._close_writer()
         self.loop.run_until_complete(self.handshake())
 
     def close(self):
         self.send_data(2, {"v": 1, "client_id": self.client_id})
-        self.sock_writer.close()
+        self._close_writer()
         self.loop.close()
 
 
@@ -134,19 +135,18 @@ class AioPresence(BaseClient):
             activity_type=activity_type,
             status_display_type=status_display_type,
         )
-        self.send_data(1, payload)
-        return await self.read_output()
+        return await self.request(payload)
 
     async def clear(self, pid: int = os.getpid()):
         payload = Payload.set_activity(pid, activity=None)
-        self.send_data(1, payload)
-        return await self.read_output()
+        return await self.request(payload)
 
     async def connect(self):
         self.update_event_loop(get_event_loop())
+        self._close_writer()
         await self.handshake()
 
     def close(self):
         self.send_data(2, {"v": 1, "client_id": self.client_id})
-        self.sock_writer.close()
+        self._close_writer()
         self.loop.close()
@@ -8,6 +8,23 @@ import time
 
 from .exceptions import PyPresenceException
 
+try:
+    import orjson
+except ImportError:  # optional, faster codec
+    orjson = None
+
+
+def json_dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def json_loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 def remove_none(d: dict):
     for item in d.copy():
@@ -21,12 +38,12 @@ def remove_none(d: dict):
     return d
 
 
-# Returns on first IPC pipe matching Discord's
-def get_ipc_path(pipe=None):
-    ipc = 'discord-ipc-'
-    if pipe:
-        ipc = f"{ipc}{pipe}"
+IPC_PREFIX = 'discord-ipc-'
+_last_ipc_path = None
 
+
+# Directories where Discord creates its IPC pipes
+def get_ipc_dirs():
     if sys.platform in ('linux', 'darwin'):
         tempdir = (os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir())
         paths = ['.', 'snap.discord', 'app/com.discordapp.Discord', 'app/com.discordapp.DiscordCanary']
@@ -34,14 +51,36 @@ def get_ipc_path(pipe=None):
         tempdir = r'\\?\pipe'
         paths = ['.']
     else:
-        return
-    
-    for path in paths:
-        full_path = os.path.abspath(os.path.join(tempdir, path))
+        return []
+    return [os.path.abspath(os.path.join(tempdir, path)) for path in paths]
+
+
+# Remembers the pipe of the last successful handshake, tried first on the next connection
+def remember_ipc_path(path):
+    global _last_ipc_path
+    _last_ipc_path = path
+
+
+# Returns on first IPC pipe matching Discord's
+def get_ipc_path(pipe=None):
+    return next(iter_ipc_paths(pipe), None)
+
+
+# Yields every IPC pipe matching Discord's, one per running Discord client,
+# the pipe of the last successful handshake first
+def iter_ipc_paths(pipe=None):
+    ipc = IPC_PREFIX
+    if pipe:
+        ipc = f"{ipc}{pipe}"
+
+    last = _last_ipc_path
+    if last and os.path.basename(last).startswith(ipc) and os.path.exists(last):
+        yield last
+    for full_path in get_ipc_dirs():
         if sys.platform == 'win32' or os.path.isdir(full_path):
             for entry in os.scandir(full_path):
-                if entry.name.startswith(ipc) and os.path.exists(entry):
-                    return entry.path
+                if entry.name.startswith(ipc) and entry.path != last and os.path.exists(entry):
+                    yield entry.path
 
 
 def get_event_loop(force_fresh=False):
@@ -0,0 +1,118 @@
+"""Runs the tests against tools.mock_plex, with tools.mock_discord where Discord is needed
+
+config.py is read on import, so the stand-ins are started and a config.json pointing
+at them is written before any module of the script gets imported.
+"""
+import asyncio
+import copy
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from tools.bench import write_config
+from tools.mock_plex import StandIns, load_fixture
+
+STAND_INS = StandIns()
+STAND_INS.start()
+DIRECTORY = tempfile.mkdtemp(prefix="plex-rpc-tests-")
+os.chdir(DIRECTORY)
+os.environ["XDG_RUNTIME_DIR"] = DIRECTORY
+write_config(DIRECTORY, STAND_INS, rate_limits=False)
+
+
+def pytest_unconfigure(config):
+    STAND_INS.stop()
+
+
+class FakeClock:
+    """Stands in for the time module of the module under test, only moves when told to"""
+
+    def __init__(self):
+        # Whole seconds, so that moving forward by whole seconds stays exact
+        self.now = float(int(time.time()))
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def wait_for(condition, timeout: float = 2) -> bool:
+    """Polls condition until it's true, returns False if it still isn't after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+async def wait_for_async(condition, timeout: float = 2) -> bool:
+    """wait_for, letting the event loop run in between"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+def make_session(position: float, state: str = "playing", **changes):
+    """The first fixture session at position seconds, with changes to its metadata"""
+    from utils.session import PlaybackSession
+
+    metadata = copy.deepcopy(load_fixture("plex")["sessions"][0])
+    metadata["viewOffset"] = int(position * 1000)
+    metadata["Player"]["state"] = state
+    metadata.update(changes)
+    return PlaybackSession.from_plex(metadata)
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def stand_ins() -> StandIns:
+    """The stand-ins, serving the fixture sessions again"""
+    with STAND_INS.plex.lock:
+        STAND_INS.plex.sessions = copy.deepcopy(load_fixture("plex")["sessions"])
+    STAND_INS.set_behaviour()
+    yield STAND_INS
+
+
+@pytest.fixture
+def replay(stand_ins, monkeypatch):
+    """Runs main.poll_plex and main.write_discord over recorded responses on a virtual clock
+
+    Returns a function taking [(timestamp, status, body)] and returning the
+    presences handed to the pipeline, as (virtual timestamp, presence).
+    """
+    import main
+    from tools.replay import VirtualClock, VirtualTimeLoop, replay as replay_records
+
+    def run(records: list[tuple[float, int, str]]) -> list[tuple[float, dict | None]]:
+        sent = []
+        send = main.Pipeline.send
+
+        def record(pipeline, to_send):
+            sent.append((main.time.time(), to_send))
+            send(pipeline, to_send)
+
+        monkeypatch.setattr(main.Pipeline, "send", record)
+        loop = VirtualTimeLoop(VirtualClock(records[0][0]))
+        try:
+            loop.run_until_complete(replay_records(records, None, stand_ins, DIRECTORY))
+        finally:
+            loop.close()
+        return sent
+
+    return run
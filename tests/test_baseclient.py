@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from patchedPypresence.client import AioClient
+from patchedPypresence.exceptions import PipeClosed
+from patchedPypresence.presence import AioPresence
+from tools.mock_discord import Faults, MockDiscord, get_socket_path
+
+CLIENT_ID = "1234567890"
+
+
+def run_against_mock(test, faults: Faults | None = None, client=AioPresence):
+    """Runs test(server, rpc) with a client connected to a MockDiscord"""
+
+    async def run():
+        async with MockDiscord(get_socket_path(), faults) as server:
+            rpc = client(CLIENT_ID, loop=asyncio.get_running_loop(), response_timeout=2)
+            await rpc.handshake()
+            try:
+                return await test(server, rpc)
+            finally:
+                rpc._close_writer()
+
+    return asyncio.run(run())
+
+
+def test_cut_response_closes_the_pipe():
+    async def test(server, rpc):
+        with pytest.raises(PipeClosed):
+            await rpc.update(details="Song")
+
+    run_against_mock(test, Faults(partial_next=1))
+
+
+def test_large_response_read_in_pieces():
+    details = "x" * 100_000
+
+    async def test(server, rpc):
+        return await rpc.update(details=details)
+
+    response = run_against_mock(test, Faults(chunk_size=1000))
+    assert response["data"]["details"] == details
+
+
+def set_activity(nonce: str) -> dict:
+    return {
+        "cmd": "SET_ACTIVITY",
+        "args": {"pid": 1, "activity": {"details": nonce}},
+        "nonce": nonce,
+    }
+
+
+def test_responses_are_matched_by_nonce():
+    async def test(server, rpc):
+        first = rpc.send_command(set_activity("first"))
+        second = rpc.send_command(set_activity("second"))
+        # The first command is never answered, the response to the second one comes first
+        response = await rpc.wait_response(second)
+        return first.done(), response
+
+    first_done, response = run_against_mock(test, Faults(hang_next=1))
+    assert not first_done
+    assert response["nonce"] == "second"
+    assert response["data"]["details"] == "second"
+
+
+def test_unsolicited_events_reach_their_handler():
+    async def test(server, rpc):
+        received = asyncio.get_running_loop().create_future()
+
+        async def on_join(data):
+            received.set_result(data)
+
+        await rpc.register_event("ACTIVITY_JOIN", on_join)
+        server.dispatch("ACTIVITY_JOIN", {"secret": "party"})
+        # The event doesn't resolve a pending command
+        pending = rpc.send_command(set_activity("pending"))
+        data = await asyncio.wait_for(received, 2)
+        return data, await rpc.wait_response(pending)
+
+    data, response = run_against_mock(test, client=AioClient)
+    assert data == {"secret": "party"}
+    assert response["nonce"] == "pending"
+
+
+def test_pending_commands_fail_when_the_pipe_closes():
+    async def test(server, rpc):
+        futures = [rpc.send_command(set_activity(nonce)) for nonce in ["first", "second"]]
+        await asyncio.sleep(0.05)
+        server.disconnect()
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    results = run_against_mock(test, Faults(hang_next=2))
+    assert [type(result) for result in results] == [PipeClosed, PipeClosed]
@@ -0,0 +1,99 @@
+import json
+import os
+import time
+
+from datetime import datetime
+
+import pytest
+
+from conftest import wait_for
+from utils import art, bearer
+from utils.bearer import REFRESH_MARGIN, TokenManager
+
+
+class Login:
+    """Counts the logins, returning token-1, token-2..."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        return f"token-{self.calls}"
+
+
+def write_token(path, token: str | None, expires: float):
+    with open(path, "w") as file:
+        json.dump(
+            {"token": token, "date": datetime.now().strftime("%d-%m-%Y"), "expires": expires},
+            file,
+        )
+
+
+def read_token(path) -> str:
+    with open(path, "r") as file:
+        return json.load(file)["token"]
+
+
+def test_token_file_is_read_once(tmp_path):
+    path = tmp_path / "token.json"
+    write_token(path, "stored", time.time() + 10 * 86400)
+    login = Login()
+    tokens = TokenManager(login, str(path))
+
+    assert tokens.get() == "stored"
+    os.remove(path)
+    assert tokens.get() == "stored"
+    assert login.calls == 0
+
+
+def test_token_is_refreshed_before_it_expires(tmp_path):
+    path = tmp_path / "token.json"
+    write_token(path, "stored", time.time() + REFRESH_MARGIN / 2)
+    login = Login()
+    tokens = TokenManager(login, str(path))
+
+    # Still valid, served while the new one is fetched in the background
+    assert tokens.get() == "stored"
+    assert wait_for(lambda: tokens.get() == "token-1")
+    assert login.calls == 1
+    assert read_token(path) == "token-1"
+
+
+def test_file_without_token_logs_in(tmp_path):
+    path = tmp_path / "token.json"
+    with open(path, "w") as file:
+        json.dump({"date": "01-01-2026"}, file)
+    tokens = TokenManager(Login(), str(path))
+
+    assert tokens.get() == "token-1"
+
+
+def test_token_file_is_replaced_atomically(tmp_path, monkeypatch):
+    path = tmp_path / "token.json"
+    write_token(path, "stored", time.time() - 1)
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(bearer.json, "dump", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        TokenManager(Login(), str(path)).get()
+    monkeypatch.undo()
+
+    assert read_token(path) == "stored"
+    assert os.listdir(tmp_path) == ["token.json"]
+
+
+def test_rejected_token_is_replaced(stand_ins, tmp_path, monkeypatch):
+    path = tmp_path / "token.json"
+    write_token(path, "revoked", time.time() + 10 * 86400)
+    monkeypatch.setattr(
+        art, "TVDB_TOKEN", TokenManager(lambda: art.get_bearer()["data"]["token"], str(path))
+    )
+    monkeypatch.setattr(stand_ins.providers, "revoked_tokens", {"revoked"})
+
+    response = art.tvdb_get(f"{art.TVDB_URL}/series/81189")
+
+    assert response.status_code == 200
+    assert read_token(path) != "revoked"
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+from conftest import wait_for
+from utils import cache
+
+
+def test_json_files_are_migrated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache, "_ready", False)
+    monkeypatch.setattr(cache, "_local", threading.local())
+    monkeypatch.setattr(cache, "_memory", OrderedDict())
+    files = {
+        os.path.join("cache", "cover_tv_81189.json"): "https://tvdb.test/81189.jpg",
+        # The key "artist_picture_AC/DC" ended up in a subdirectory
+        os.path.join("cache", "artist_picture_AC", "DC.json"): "https://fanart.test/acdc.jpg",
+    }
+    for path, url in files.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"timestamp": time.time(), "data": url}, f)
+
+    assert cache.get_cached_data("81189", "cover_tv") == "https://tvdb.test/81189.jpg"
+    assert cache.get_cached_data("AC/DC", "artist_picture") == "https://fanart.test/acdc.jpg"
+    # Only the database (and its WAL files) is left
+    assert all(name.startswith("cache.db") for name in os.listdir("cache"))
+
+
+class Fetch:
+    """Counts the calls to a fetch function returning the given results in turn"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        result = self.results[min(self.calls, len(self.results) - 1)]
+        self.calls += 1
+        return result
+
+
+def test_fresh_entries_are_served_from_the_cache(clock, monkeypatch):
+    monkeypatch.setattr(cache, "time", clock)
+    fetch = Fetch("cover-1", "cover-2")
+    assert cache.get_or_fetch("cover_tv", "test-fresh", fetch) == "cover-1"
+    clock.now += cache.get_ttl("cover_tv") - 1
+    assert cache.get_or_fetch("cover_tv", "test-fresh", fetch) == "cover-1"
+    assert fetch.calls == 1
+
+
+def test_misses_are_cached_for_the_negative_ttl(clock, monkeypatch):
+    monkeypatch.setattr(cache, "time", clock)
+    fetch = Fetch(None, "cover")
+    assert cache.get_or_fetch("cover_tv", "test-negative", fetch) is None
+    assert cache.get_or_fetch("cover_tv", "test-negative", fetch) is None
+    assert fetch.calls == 1
+
+    clock.now += cache.get_ttl("negative") + 1
+    assert cache.get_or_fetch("cover_tv", "test-negative", fetch) == "cover"
+    assert fetch.calls == 2
+
+
+def test_stale_entries_are_served_while_refreshed(clock, monkeypatch):
+    monkeypatch.setattr(cache, "time", clock)
+    fetch = Fetch("old-cover", "new-cover")
+    cache.get_or_fetch("cover_tv", "test-stale", fetch)
+    clock.now += cache.get_ttl("cover_tv") + 1
+    before = cache.get_cache_stats()
+
+    assert cache.get_or_fetch("cover_tv", "test-stale", fetch) == "old-cover"
+    assert cache.get_cache_stats()["stale"] == before["stale"] + 1
+    assert wait_for(lambda: cache.get_or_fetch("cover_tv", "test-stale", fetch) == "new-cover")
+    assert fetch.calls == 2
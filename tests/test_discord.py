@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from conftest import wait_for_async
+from patchedPypresence.exceptions import PipeClosed, ServerError
+from tools.mock_discord import Faults, MockDiscord, get_socket_path
+from utils.fanout import FanoutPresence
+
+CLIENT_ID = "1234567890"
+
+
+def test_presence_is_sent_to_every_client():
+    async def run():
+        async with (
+            MockDiscord(get_socket_path(0)) as stable,
+            MockDiscord(get_socket_path(1)) as canary,
+        ):
+            presence = FanoutPresence(CLIENT_ID)
+            await presence.connect()
+            try:
+                await presence.update(details="Song", state="Artist")
+                assert await wait_for_async(lambda: stable.activities() and canary.activities())
+                await presence.clear()
+                assert await wait_for_async(lambda: len(stable.activities()) == len(canary.activities()) == 2)
+            finally:
+                presence.close()
+            return stable.activities(), canary.activities()
+
+    stable, canary = asyncio.run(run())
+    assert stable == canary
+    assert stable[0]["details"] == "Song"
+    assert stable[1] is None
+
+
+def test_lost_client_is_reconnected_and_caught_up():
+    async def run():
+        async with (
+            MockDiscord(get_socket_path(0)) as stable,
+            MockDiscord(get_socket_path(1)) as canary,
+        ):
+            presence = FanoutPresence(CLIENT_ID)
+            await presence.connect()
+            try:
+                await presence.update(details="First")
+                assert await wait_for_async(lambda: stable.activities() and canary.activities())
+                canary.disconnect()
+                # Still acknowledged by the client left, the other one fails and is reconnected
+                await presence.update(details="Second")
+                assert await wait_for_async(lambda: canary.connections == 2)
+                assert await wait_for_async(lambda: canary.activities()[-1]["details"] == "Second")
+            finally:
+                presence.close()
+            return stable, canary
+
+    stable, canary = asyncio.run(run())
+    assert [activity["details"] for activity in stable.activities()] == ["First", "Second"]
+    assert canary.activities()[0]["details"] == "First"
+
+
+def test_rejected_presence_keeps_the_connection():
+    async def run():
+        async with (
+            MockDiscord(get_socket_path(0), Faults(fail_next=1)) as stable,
+            MockDiscord(get_socket_path(1)) as canary,
+        ):
+            presence = FanoutPresence(CLIENT_ID)
+            await presence.connect()
+            try:
+                # Acknowledged by the client that accepted it
+                await presence.update(details="A")
+                await asyncio.sleep(0.2)
+                rejected = [activity["details"] for activity in stable.activities()]
+                await presence.update(details="Next")
+            finally:
+                presence.close()
+            return stable, rejected
+
+    stable, rejected = asyncio.run(run())
+    # Neither reconnected nor sent again
+    assert stable.connections == 1
+    assert rejected == ["A"]
+    assert stable.activities()[-1]["details"] == "Next"
+
+
+def test_presence_rejected_by_every_client_raises():
+    async def run():
+        async with MockDiscord(get_socket_path(0), Faults(fail_next=1)) as server:
+            presence = FanoutPresence(CLIENT_ID)
+            await presence.connect()
+            try:
+                with pytest.raises(ServerError):
+                    await presence.update(details="A")
+                await asyncio.sleep(0.2)
+            finally:
+                presence.close()
+            return server
+
+    assert asyncio.run(run()).connections == 1
+
+
+def test_client_dropping_every_connection_is_reconnected_with_backoff():
+    async def run():
+        async with MockDiscord(get_socket_path(0), Faults(disconnect_after=1)) as server:
+            presence = FanoutPresence(CLIENT_ID)
+            await presence.connect()
+            try:
+                with pytest.raises(PipeClosed):
+                    await presence.update(details="A")
+                await asyncio.sleep(1)
+            finally:
+                presence.close()
+            return server
+
+    # Once right away, then after a backoff delay
+    assert asyncio.run(run()).connections <= 4
@@ -0,0 +1,72 @@
+import copy
+import json
+
+from main import END_GRACE
+from tools.mock_plex import load_fixture
+
+START = 1_790_000_000.0
+
+
+def sessions_response(sessions: list[dict]) -> str:
+    return json.dumps({"MediaContainer": {"size": len(sessions), "Metadata": sessions}})
+
+
+class Recording:
+    """Builds the /status/sessions responses of a track, one per second"""
+
+    def __init__(self):
+        self.track = copy.deepcopy(load_fixture("plex")["sessions"][2])
+        self.track["Player"]["state"] = "playing"
+        self.records = []
+        self.t = START
+
+    def play(self, start: int, end: int):
+        """Plays from start to end, in seconds"""
+        for position in range(start, end + 1):
+            self.report(position)
+
+    def stay(self, position: int, seconds: int):
+        """Still reported as playing without moving"""
+        for _ in range(seconds):
+            self.report(position)
+
+    def report(self, position: int):
+        self.track["viewOffset"] = position * 1000
+        self.records.append((self.t, 200, sessions_response([self.track])))
+        self.t += 1
+
+    def stop(self, seconds: int):
+        for _ in range(seconds):
+            self.records.append((self.t, 200, sessions_response([])))
+            self.t += 1
+
+
+def clears(sent: list) -> list[float]:
+    return [t - START for t, to_send in sent if to_send is None]
+
+
+def test_cleared_at_the_end_when_still_reported(replay):
+    recording = Recording()
+    duration = recording.track["duration"] // 1000
+    recording.play(duration - 60, duration)
+    recording.stay(duration, 90)
+    recording.stop(30)
+
+    cleared = clears(replay(recording.records))
+    assert cleared and 60 < cleared[0] <= 60 + END_GRACE + 2
+
+
+def test_cleared_again_after_seeking_back(replay):
+    recording = Recording()
+    duration = recording.track["duration"] // 1000
+    recording.play(duration - 60, duration)
+    recording.stay(duration, 60)
+    second_end = recording.t - START + duration - duration // 2
+    recording.play(duration // 2, duration)
+    recording.stay(duration, 300)
+    recording.stop(30)
+
+    cleared = clears(replay(recording.records))
+    assert len(cleared) >= 2
+    assert 60 < cleared[0] <= 60 + END_GRACE + 2
+    assert second_end < cleared[1] <= second_end + END_GRACE + 2
@@ -0,0 +1,74 @@
+import time
+import warnings
+
+import pytest
+import urllib3
+
+from utils import http
+from utils.throttle import CircuitBreaker, TokenBucket
+
+
+def test_retries_go_through_the_rate_limit(stand_ins, monkeypatch):
+    url = stand_ins.urls["plex"] + "/identity"
+    host = http.get_host(url)
+    monkeypatch.setattr(http, "RETRY_BACKOFF", 0)
+    monkeypatch.setitem(http._limits, host, TokenBucket(rate=5))
+    stand_ins.set_behaviour(error_rate=1)
+    before = stand_ins.requests["plex"]
+
+    start = time.monotonic()
+    response = http.get(url)
+    elapsed = time.monotonic() - start
+
+    assert response.status_code == 503
+    assert stand_ins.requests["plex"] - before == http.RETRIES + 1
+    # Each retry waited for a token of its own
+    assert elapsed >= http.RETRIES / 5 * 0.9
+
+
+def test_latency_summary_lists_the_hosts_called(stand_ins, caplog):
+    url = stand_ins.urls["plex"] + "/identity"
+    http.get(url)
+
+    with caplog.at_level("INFO", logger=http.LOGGER.name):
+        http.log_request_stats()
+
+    assert any(http.get_host(url) in message for message in caplog.messages)
+
+
+def test_open_circuit_shows_in_the_summary(stand_ins, monkeypatch, caplog):
+    url = stand_ins.urls["plex"] + "/identity"
+    host = http.get_host(url)
+    monkeypatch.setattr(http, "RETRY_BACKOFF", 0)
+    monkeypatch.setitem(http._breakers, host, CircuitBreaker(threshold=1, cooldown=60))
+    stand_ins.set_behaviour(error_rate=1)
+
+    # The first failure opens the circuit, the retry isn't sent
+    with pytest.raises(http.CircuitOpenError):
+        http.get(url)
+    caplog.clear()
+    with caplog.at_level("INFO", logger=http.LOGGER.name):
+        http.log_request_stats()
+
+    line = next(message for message in caplog.messages if host in message)
+    assert f"circuit {CircuitBreaker.OPEN}, 1 calls skipped" in line
+
+
+def test_only_the_trusted_host_is_silenced():
+    def warn(host: str):
+        warnings.warn(
+            f"Unverified HTTPS request is being made to host '{host}'. "
+            "Adding certificate verification is strongly advised.",
+            urllib3.exceptions.InsecureRequestWarning,
+        )
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        http.trust_host("https://plex.test:32400")
+        warn("plex.test")
+        warn("musicbrainz.org")
+
+    assert [str(warning.message) for warning in caught] == [
+        "Unverified HTTPS request is being made to host 'musicbrainz.org'. "
+        "Adding certificate verification is strongly advised."
+    ]
@@ -0,0 +1,17 @@
+from conftest import wait_for
+from utils.notifications import PlexEventSource
+
+
+def test_notification_applied_within_a_second(stand_ins):
+    plex = stand_ins.plex
+    session = plex.sessions[0]
+    events = PlexEventSource()
+    events.start()
+    assert wait_for(lambda: events.connected and events.get_activity() is not None, 5)
+    assert events.get_activity()["Player"]["state"] == "playing"
+
+    with plex.lock:
+        session["Player"]["state"] = "paused"
+    plex.notify(session["sessionKey"])
+
+    assert wait_for(lambda: events.get_activity()["Player"]["state"] == "paused", 1)
@@ -0,0 +1,52 @@
+from conftest import make_session
+from utils.playback import Action, PlaybackTracker, Transition, TRANSITION_ACTIONS
+
+
+def test_transitions():
+    tracker = PlaybackTracker(drift_threshold=10)
+    observed = [
+        tracker.observe(None, now=0),
+        tracker.observe(make_session(100), now=0),
+        tracker.observe(make_session(105), now=5),
+        # Plex reporting a few seconds late isn't a seek
+        tracker.observe(make_session(106), now=10),
+        tracker.observe(make_session(200), now=15),
+        tracker.observe(make_session(200, "paused"), now=20),
+        tracker.observe(make_session(200, "paused"), now=80),
+        tracker.observe(make_session(200), now=90),
+        tracker.observe(make_session(10, ratingKey="1"), now=95),
+        tracker.observe(None, now=100),
+        tracker.observe(None, now=105),
+    ]
+    assert observed == [
+        Transition.UNCHANGED,
+        Transition.STARTED,
+        Transition.UNCHANGED,
+        Transition.UNCHANGED,
+        Transition.SEEKED,
+        Transition.PAUSED,
+        Transition.UNCHANGED,
+        Transition.RESUMED,
+        Transition.MEDIA_CHANGED,
+        Transition.STOPPED,
+        Transition.UNCHANGED,
+    ]
+    assert [TRANSITION_ACTIONS[transition] for transition in observed[1:6]] == [
+        Action.REBUILD,
+        Action.NONE,
+        Action.NONE,
+        Action.PROGRESS,
+        Action.PROGRESS,
+    ]
+
+
+def test_position_is_extrapolated_while_playing():
+    tracker = PlaybackTracker()
+    session = make_session(100)
+    tracker.observe(session, now=0)
+
+    assert tracker.position(now=30) == 130
+    assert tracker.remaining(now=30) == session.duration / 1000 - 130
+
+    tracker.observe(make_session(130, "paused"), now=30)
+    assert tracker.position(now=90) == 130
@@ -0,0 +1,19 @@
+from conftest import make_session
+from utils.playback import PlaybackTracker, Transition
+from utils.polling import END_POLL, PAUSED_POLL, PollScheduler
+
+
+def test_poll_delays():
+    polling = PollScheduler(poll_interval=60)
+    tracker = PlaybackTracker()
+
+    idle = [polling.next_delay(tracker, Transition.UNCHANGED) for _ in range(6)]
+    assert idle == sorted(idle) and idle[0] < idle[-1] == polling.idle_max
+
+    session = make_session(0)
+    tracker.observe(session)
+    assert polling.next_delay(tracker, Transition.UNCHANGED) == 60
+    tracker.observe(make_session(session.duration / 1000 - 5))
+    assert polling.next_delay(tracker, Transition.SEEKED) == END_POLL
+    tracker.observe(make_session(100, "paused"))
+    assert polling.next_delay(tracker, Transition.UNCHANGED) == PAUSED_POLL
@@ -0,0 +1,55 @@
+import asyncio
+import os
+
+import pytest
+
+from patchedPypresence import utils as ipc
+from utils.reconnect import Backoff, IpcWatcher
+
+
+@pytest.fixture
+def ipc_dir(tmp_path, monkeypatch):
+    """An empty directory where Discord would create its IPC sockets"""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    monkeypatch.setattr(ipc, "_last_ipc_path", None)
+    return tmp_path
+
+
+def test_backoff_grows_up_to_the_cap():
+    backoff = Backoff(base=1, cap=8)
+    delays = [backoff.next() for _ in range(6)]
+    for delay, expected in zip(delays, [1, 2, 4, 8, 8, 8]):
+        assert expected / 2 <= delay <= expected
+
+    backoff.reset()
+    assert backoff.next() <= 1
+
+
+def test_last_ipc_path_comes_first(ipc_dir):
+    for pipe in range(3):
+        (ipc_dir / f"discord-ipc-{pipe}").touch()
+    last = str(ipc_dir / "discord-ipc-2")
+    ipc.remember_ipc_path(last)
+
+    paths = list(ipc.iter_ipc_paths())
+    assert paths[0] == last
+    assert sorted(paths) == [str(ipc_dir / f"discord-ipc-{pipe}") for pipe in range(3)]
+    assert ipc.get_ipc_path() == last
+
+    os.remove(last)
+    assert last not in ipc.iter_ipc_paths()
+
+
+def test_watcher_wakes_up_when_a_socket_appears(ipc_dir):
+    async def run():
+        watcher = IpcWatcher()
+        try:
+            assert not await watcher.wait(0.1)
+            waiting = asyncio.create_task(watcher.wait(5))
+            await asyncio.sleep(0.05)
+            (ipc_dir / "discord-ipc-0").touch()
+            return await asyncio.wait_for(waiting, 2)
+        finally:
+            watcher.close()
+
+    assert asyncio.run(run())
@@ -0,0 +1,53 @@
+import asyncio
+
+from utils.scheduler import PresenceScheduler, TIMESTAMP_TOLERANCE
+
+PLAYING = dict(state="S1・E1 - Pilot", large_image="show", start=1000, end=3000)
+
+
+async def write_all(scheduler: PresenceScheduler, timeout: float) -> list:
+    """Presences the Discord writer would write within timeout seconds"""
+    written = []
+
+    async def writer():
+        while True:
+            to_send = await scheduler.next()
+            written.append(to_send)
+            scheduler.sent(to_send)
+
+    task = asyncio.create_task(writer())
+    await asyncio.sleep(timeout)
+    task.cancel()
+    return written
+
+
+def test_unchanged_presences_are_skipped():
+    async def run():
+        scheduler = PresenceScheduler()
+        scheduler.submit(PLAYING)
+        written = await write_all(scheduler, 0.05)
+        scheduler.submit(PLAYING)
+        scheduler.submit(None)
+        scheduler.submit({**PLAYING, "start": PLAYING["start"] + TIMESTAMP_TOLERANCE})
+        written += await write_all(scheduler, 0.05)
+        return scheduler, written
+
+    scheduler, written = asyncio.run(run())
+    assert written == [PLAYING]
+    assert scheduler.coalesced == 2
+    assert scheduler.skipped == 1
+
+
+def test_writes_are_paced_and_coalesced():
+    async def run():
+        scheduler = PresenceScheduler(limit=2, window=0.3)
+        writing = asyncio.create_task(write_all(scheduler, 0.5))
+        for index in range(5):
+            scheduler.submit({**PLAYING, "state": f"S1・E{index}"})
+            await asyncio.sleep(0.01)
+        return scheduler, await writing
+
+    scheduler, written = asyncio.run(run())
+    # Two slots per window, the next ones replaced each other until one was free
+    assert [to_send["state"] for to_send in written] == ["S1・E0", "S1・E1", "S1・E4"]
+    assert scheduler.coalesced == 2
@@ -0,0 +1,37 @@
+import copy
+
+import main
+from conftest import make_session
+from tools.mock_plex import load_fixture
+from utils.session import PlaybackSession
+
+
+def parse_fixture(index: int, *missing: str) -> PlaybackSession:
+    """A fixture session without some of its fields"""
+    metadata = copy.deepcopy(load_fixture("plex")["sessions"][index])
+    for field in missing:
+        metadata.pop(field, None)
+    return PlaybackSession.from_plex(metadata)
+
+
+def test_sessions_compare_by_value():
+    assert make_session(100) == make_session(100)
+    assert hash(make_session(100)) == hash(make_session(100))
+    assert make_session(100) != make_session(101)
+
+
+def test_episode_numbers_left_out_when_missing():
+    assert main.parse_episode(parse_fixture(0))["state"] == "S3・E9 - The Rains of Castamere"
+    assert (
+        main.parse_episode(parse_fixture(0, "parentIndex"))["state"]
+        == "E9 - The Rains of Castamere"
+    )
+    assert (
+        main.parse_episode(parse_fixture(0, "parentIndex", "index"))["state"]
+        == "The Rains of Castamere"
+    )
+
+
+def test_movie_year_left_out_when_missing():
+    assert main.parse_movie(parse_fixture(1))["state"] == "2000"
+    assert "state" not in main.parse_movie(parse_fixture(1, "year"))
@@ -0,0 +1,38 @@
+import pytest
+
+from utils import timers
+from utils.timers import TimerQueue
+
+
+@pytest.fixture
+def queue(clock, monkeypatch) -> TimerQueue:
+    monkeypatch.setattr(timers, "time", clock)
+    return TimerQueue()
+
+
+def test_timers_fire_in_order(queue, clock):
+    queue.schedule("end", 30)
+    queue.schedule("stats", 10)
+    queue.schedule("overrun", 20)
+
+    assert queue.timeout() == pytest.approx(10)
+    clock.now += 25
+    assert queue.pop_due() == ["stats", "overrun"]
+    assert queue.timeout() == pytest.approx(5)
+    clock.now += 5
+    assert queue.pop_due() == ["end"]
+    assert queue.timeout() is None
+
+
+def test_rescheduled_and_cancelled_timers(queue, clock):
+    queue.schedule("end", 10)
+    queue.schedule("overrun", 15)
+    # e.g. a seek moving the end of the media
+    queue.schedule("end", 40)
+    queue.cancel("overrun")
+
+    assert queue.timeout() == pytest.approx(40)
+    clock.now += 20
+    assert queue.pop_due() == []
+    clock.now += 20
+    assert queue.pop_due() == ["end"]
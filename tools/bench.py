@@ -0,0 +1,318 @@
+"""End-to-end benchmark of the poll -> parse -> artwork -> Discord pipeline, against the stand-ins
+
+    python -m tools.bench --output bench.json
+    python -m tools.bench --iterations 50 --latency 0.02 --compare bench.json
+
+Runs in a temporary directory with a config.json pointing at tools.mock_plex and
+tools.mock_discord, so the cache starts cold and nothing real is called.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from tools.mock_discord import MockDiscord
+from tools.mock_plex import SERVICES, StandIns
+
+MEDIA_TYPES = ["episode", "movie", "track", "clip"]
+STAGES = ["poll", "parse", "art", "rpc", "total"]
+UNLIMITED = 1000  # requests per second, so that provider rate limits don't hide the code
+
+
+def summarize(timings: list[float]) -> dict:
+    """Summarizes durations in milliseconds"""
+    if not timings:
+        return dict(count=0)
+    ordered = sorted(timings)
+    return dict(
+        count=len(ordered),
+        mean_ms=round(sum(ordered) / len(ordered), 3),
+        p50_ms=round(ordered[len(ordered) // 2], 3),
+        p90_ms=round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 3),
+        max_ms=round(ordered[-1], 3),
+    )
+
+
+def get_version() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_config(directory: str, stand_ins: StandIns, rate_limits: bool):
+    with open(os.path.join(REPO_DIR, "config.example.json")) as f:
+        config = json.load(f)
+    config.update(stand_ins.get_config(), username="", libraries=[], ingestion="polling")
+    if not rate_limits:
+        config["rate_limits"] = {service: UNLIMITED for service in SERVICES[1:]}
+    with open(os.path.join(directory, "config.json"), "w") as f:
+        json.dump(config, f)
+
+
+class Pipeline:
+    """Runs the stages of one update of main.poll_plex, timing each of them"""
+
+    def __init__(self, stand_ins: StandIns, rpc):
+        # Imported once config.json points at the stand-ins
+        import main
+        from utils import cache, plex
+
+        self.main = main
+        self.cache = cache
+        self.plex = plex
+        self.stand_ins = stand_ins
+        self.rpc = rpc
+
+    async def update(self, session: dict, alone: bool = True) -> dict[str, float]:
+        """Publishes the activity of a session, returns the duration of each stage in ms
+
+        Args:
+            session (dict): Session to publish
+            alone (bool, optional): Make it the only session playing, otherwise it's
+                looked up among all sessions by user and library. Defaults to True.
+        """
+        if alone:
+            with self.stand_ins.plex.lock:
+                self.stand_ins.plex.sessions = [session]
+            username, libraries = "", []
+        else:
+            username = session["User"]["title"]
+            libraries = [session["librarySectionTitle"]]
+        timings = {}
+        start = stage = time.perf_counter()
+
+        def lap(name: str):
+            nonlocal stage
+            now = time.perf_counter()
+            timings[name] = (now - stage) * 1000
+            stage = now
+
+        activity = self.plex.get_my_activity(username=username, libraries=libraries)
+        lap("poll")
+        playback = self.main.PlaybackSession.from_plex(activity)
+        to_send = self.main.get_corresponding_infos(session=playback)
+        lap("parse")
+        to_send = self.main.with_artwork(
+            to_send, self.main.get_artwork(playback, time.monotonic() + self.main.UPDATE_BUDGET)
+        )
+        lap("art")
+        await self.rpc.update(**to_send)
+        lap("rpc")
+        timings["total"] = (stage - start) * 1000
+        return timings
+
+    def counters(self) -> dict:
+        return dict(cache=self.cache.get_cache_stats(), providers=dict(self.stand_ins.requests))
+
+
+def diff_counters(before: dict, after: dict) -> dict:
+    cache = {key: after["cache"][key] - before["cache"][key] for key in after["cache"]}
+    lookups = cache["hits"] + cache["negative_hits"] + cache["stale"] + cache["misses"]
+    cache["hit_ratio"] = round((lookups - cache["misses"]) / lookups, 3) if lookups else None
+    providers = {
+        key: after["providers"][key] - before["providers"][key] for key in after["providers"]
+    }
+    return dict(cache=cache, provider_calls=providers)
+
+
+def take_sessions(pool: list[dict], media_type: str, count: int) -> list[dict]:
+    """Takes count sessions of a type out of the pool, each with media not seen yet"""
+    taken = [session for session in pool if session["type"] == media_type][:count]
+    for session in taken:
+        pool.remove(session)
+    return taken
+
+
+async def measure_latency(pipeline: Pipeline, pool: list[dict], iterations: int) -> tuple[dict, dict]:
+    """Cold runs use a media never seen before each time, warm runs repeat the same one"""
+    latency = {}
+    counters = {}
+    for temperature in ["cold", "warm"]:
+        picked = {
+            media_type: take_sessions(pool, media_type, iterations if temperature == "cold" else 1)
+            for media_type in MEDIA_TYPES
+        }
+        if temperature == "warm":
+            for media_type, sessions in picked.items():
+                await pipeline.update(sessions[0])
+                picked[media_type] = sessions * iterations
+
+        before = pipeline.counters()
+        for media_type, sessions in picked.items():
+            runs = [await pipeline.update(session) for session in sessions]
+            latency.setdefault(media_type, {})[temperature] = {
+                stage: summarize([run[stage] for run in runs]) for stage in STAGES
+            }
+        counters[temperature] = diff_counters(before, pipeline.counters())
+    return latency, counters
+
+
+async def measure_allocations(pipeline: Pipeline, pool: list[dict], iterations: int) -> dict:
+    """Peak and retained traced memory of one update, in KiB"""
+    allocations = {}
+    tracemalloc.start()
+    try:
+        for media_type in MEDIA_TYPES:
+            cold = take_sessions(pool, media_type, iterations)
+            warm = take_sessions(pool, media_type, 1) * iterations
+            await pipeline.update(warm[0])
+            for temperature, sessions in [("cold", cold), ("warm", warm)]:
+                peaks = []
+                retained = []
+                for session in sessions:
+                    tracemalloc.reset_peak()
+                    before = tracemalloc.get_traced_memory()[0]
+                    await pipeline.update(session)
+                    current, peak = tracemalloc.get_traced_memory()
+                    peaks.append((peak - before) / 1024)
+                    retained.append((current - before) / 1024)
+                allocations.setdefault(media_type, {})[temperature] = dict(
+                    peak_kib=round(sum(peaks) / len(peaks), 1),
+                    retained_kib=round(sum(retained) / len(retained), 1),
+                )
+    finally:
+        tracemalloc.stop()
+    return allocations
+
+
+async def measure_throughput(pipeline: Pipeline, iterations: int) -> dict:
+    """Polls and updates per second with every synthetic session playing at once"""
+    plex = pipeline.plex
+    sessions = list(pipeline.stand_ins.plex.sessions)
+    last_user = sessions[-1]["User"]["title"]
+
+    polls = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        plex.find_my_stream(plex.get_activity()["data"], username=last_user, libraries=[])
+        polls.append((time.perf_counter() - start) * 1000)
+
+    throughput = dict(sessions=len(sessions), poll=summarize(polls))
+    throughput["polls_per_s"] = round(1000 / throughput["poll"]["mean_ms"], 1)
+    for temperature in ["cold", "warm"]:
+        before = pipeline.counters()
+        start = time.perf_counter()
+        for session in sessions:
+            await pipeline.update(session, alone=False)
+        elapsed = time.perf_counter() - start
+        throughput[f"updates_per_s_{temperature}"] = round(len(sessions) / elapsed, 1)
+        throughput[temperature] = diff_counters(before, pipeline.counters())
+    return throughput
+
+
+async def run(args) -> dict:
+    stand_ins = StandIns()
+    stand_ins.set_behaviour(latency=args.latency, jitter=args.jitter)
+    stand_ins.start()
+    directory = tempfile.mkdtemp(prefix="plex-rpc-bench-")
+    os.chdir(directory)
+    os.environ["XDG_RUNTIME_DIR"] = directory
+    write_config(directory, stand_ins, args.rate_limits)
+
+    from utils.fanout import FanoutPresence
+
+    async with MockDiscord(os.path.join(directory, "discord-ipc-0")):
+        rpc = FanoutPresence("0", loop=asyncio.get_running_loop())
+        await rpc.connect()
+        pipeline = Pipeline(stand_ins, rpc)
+
+        # Enough never seen media for every cold run
+        generated = len(MEDIA_TYPES) * (args.iterations * 2 + 8)
+        stand_ins.plex.generate_sessions(generated)
+        pool = list(stand_ins.plex.sessions)
+        latency, counters = await measure_latency(pipeline, pool, args.iterations)
+        allocations = await measure_allocations(pipeline, pool, min(args.iterations, 5))
+
+        stand_ins.plex.generate_sessions(
+            args.sessions, args.users, args.libraries, start=generated
+        )
+        throughput = await measure_throughput(pipeline, args.iterations)
+        rpc.close()
+    stand_ins.stop()
+
+    return dict(
+        meta=dict(
+            version=get_version(),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            iterations=args.iterations,
+            latency_s=args.latency,
+            rate_limits=args.rate_limits,
+            timestamp=int(time.time()),
+        ),
+        latency=latency,
+        cache=counters,
+        allocations=allocations,
+        throughput=throughput,
+    )
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    """Lines comparing the median total latency and throughput to a previous run"""
+
+    def ratio(new, old) -> str:
+        return f"{new / old:.2f}x" if old else "n/a"
+
+    lines = [f"Compared to {baseline['meta'].get('version')}:"]
+    for media_type, temperatures in results["latency"].items():
+        for temperature, stages in temperatures.items():
+            new = stages["total"]["p50_ms"]
+            old = baseline["latency"][media_type][temperature]["total"]["p50_ms"]
+            lines.append(f"  {media_type:<8}{temperature:<5} p50 {old:>9.2f}ms -> {new:>9.2f}ms ({ratio(new, old)})")
+    for key in ["polls_per_s", "updates_per_s_cold", "updates_per_s_warm"]:
+        new = results["throughput"][key]
+        old = baseline["throughput"][key]
+        lines.append(f"  {key:<22} {old:>9} -> {new:>9} ({ratio(new, old)})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20, help="runs per media type and cache state")
+    parser.add_argument("--sessions", type=int, default=500, help="sessions playing during the throughput run")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--libraries", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added by every stand-in")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limits", action="store_true", help="keep the provider rate limits")
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    logging.disable(logging.CRITICAL)
+    results = asyncio.run(run(args))
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    if baseline:
+        print("\n".join(compare(results, baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Stand-in for the Discord client IPC, for integration tests and latency benchmarks
+
+    python -m tools.mock_discord                      # serve on $XDG_RUNTIME_DIR/discord-ipc-0
+    python -m tools.mock_discord --delay 0.05 --error-rate 0.1
+    python -m tools.mock_discord --bench 500          # measure update round trips
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import struct
+import tempfile
+import time
+
+from dataclasses import dataclass
+
+HEADER = struct.Struct("<II")
+OP_HANDSHAKE = 0
+OP_FRAME = 1
+OP_CLOSE = 2
+OP_PING = 3
+OP_PONG = 4
+
+
+@dataclass
+class Received:
+    """A frame received by the mock server"""
+
+    timestamp: float
+    client: int
+    op: int
+    payload: dict | None
+
+
+@dataclass
+class Faults:
+    """Misbehaviours injected by the mock server, can be changed while it runs"""
+
+    delay: float = 0.0  # seconds before each response
+    jitter: float = 0.0  # extra random delay, up to this many seconds
+    error_rate: float = 0.0  # ratio of commands answered with an ERROR event
+    drop_rate: float = 0.0  # ratio of commands never answered
+    fail_next: int = 0  # next commands answered with an ERROR event
+    hang_next: int = 0  # next commands never answered
+    partial_next: int = 0  # next responses cut in the middle, then the connection closes
+    chunk_size: int = 0  # responses written in pieces of this many bytes, 0 for whole frames
+    disconnect_after: int | None = None  # frames per connection before closing it
+    reject_handshake: bool = False  # answer the handshake with "Invalid Client ID"
+    handshake_delay: float = 0.0  # seconds before answering the handshake
+
+
+def get_socket_path(pipe: int = 0) -> str:
+    """Path where patchedPypresence looks for the first Discord IPC socket"""
+    tempdir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(tempdir, f"discord-ipc-{pipe}")
+
+
+def encode_frame(op: int, payload: dict) -> bytes:
+    data = json.dumps(payload).encode("utf-8")
+    return HEADER.pack(op, len(data)) + data
+
+
+class MockDiscord:
+    """Unix socket server speaking the Discord IPC framing
+
+    Answers the handshake with READY and every command with a plausible response,
+    records every frame received and injects the faults of self.faults.
+    """
+
+    def __init__(self, path: str | None = None, faults: Faults | None = None):
+        self.path = path or get_socket_path()
+        self.faults = faults or Faults()
+        self.received: list[Received] = []
+        self.connections = 0
+        self._server: asyncio.AbstractServer | None = None
+        self._writers: dict[int, asyncio.StreamWriter] = {}
+        self._handlers: set[asyncio.Task] = set()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            with socket.socket(socket.AF_UNIX) as probe:
+                if probe.connect_ex(self.path) == 0:
+                    raise OSError(f"{self.path} is in use, is Discord running?")
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._serve, self.path)
+
+    async def close(self):
+        self.disconnect()
+        if self._handlers:
+            await asyncio.wait(self._handlers)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def disconnect(self):
+        """Closes every client connection, the socket keeps accepting new ones"""
+        for writer in list(self._writers.values()):
+            writer.close()
+        self._writers.clear()
+
+    def dispatch(self, event: str, data: dict | None = None):
+        """Sends a DISPATCH event (e.g.: ACTIVITY_JOIN) to every connected client"""
+        frame = encode_frame(OP_FRAME, {"cmd": "DISPATCH", "evt": event, "data": data or {}})
+        for writer in self._writers.values():
+            writer.write(frame)
+
+    def activities(self) -> list[dict | None]:
+        """Returns the activities received through SET_ACTIVITY, None for the clears"""
+        return [
+            frame.payload["args"].get("activity")
+            for frame in self.received
+            if frame.payload and frame.payload.get("cmd") == "SET_ACTIVITY"
+        ]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        client = self.connections
+        self._writers[client] = writer
+        self._handlers.add(asyncio.current_task())
+        frames = 0
+        try:
+            while True:
+                op, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                data = await reader.readexactly(length)
+                try:
+                    payload = json.loads(data)
+                except ValueError:
+                    payload = None
+                self.received.append(Received(time.time(), client, op, payload))
+                frames += 1
+
+                if op == OP_CLOSE:
+                    break
+                if op == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload or {}))
+                elif op == OP_HANDSHAKE:
+                    await asyncio.sleep(self.faults.handshake_delay)
+                    writer.write(encode_frame(OP_FRAME, self._handshake_response()))
+                elif not await self._respond(writer, payload):
+                    break
+                await writer.drain()
+
+                limit = self.faults.disconnect_after
+                if limit is not None and frames >= limit:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.pop(client, None)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def _handshake_response(self) -> dict:
+        if self.faults.reject_handshake:
+            return {"code": 4000, "message": "Invalid Client ID"}
+        return {
+            "cmd": "DISPATCH",
+            "evt": "READY",
+            "data": {
+                "v": 1,
+                "config": {"cdn_host": "cdn.discordapp.com", "environment": "production"},
+                "user": {"id": "0", "username": "mock", "discriminator": "0"},
+            },
+        }
+
+    async def _respond(self, writer: asyncio.StreamWriter, payload: dict | None) -> bool:
+        """Answers a command, returns False if the connection must be closed"""
+        faults = self.faults
+        if faults.hang_next > 0:
+            faults.hang_next -= 1
+            return True
+        if random.random() < faults.drop_rate:
+            return True
+
+        delay = faults.delay + random.uniform(0, faults.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        payload = payload or {}
+        command = payload.get("cmd")
+        nonce = payload.get("nonce")
+        if faults.fail_next > 0 or random.random() < faults.error_rate:
+            faults.fail_next = max(0, faults.fail_next - 1)
+            response = {
+                "cmd": command,
+                "evt": "ERROR",
+                "data": {"code": 1000, "message": "Injected error"},
+                "nonce": nonce,
+            }
+        elif command == "SET_ACTIVITY":
+            response = {
+                "cmd": command,
+                "evt": None,
+                "data": payload.get("args", {}).get("activity"),
+                "nonce": nonce,
+            }
+        else:
+            response = {"cmd": command, "evt": None, "data": {}, "nonce": nonce}
+
+        frame = encode_frame(OP_FRAME, response)
+        if faults.partial_next > 0:
+            faults.partial_next -= 1
+            writer.write(frame[: len(frame) // 2])
+            await writer.drain()
+            return False
+        if faults.chunk_size:
+            for start in range(0, len(frame), faults.chunk_size):
+                writer.write(frame[start : start + faults.chunk_size])
+                await writer.drain()
+                # Let the client read each piece on its own
+                await asyncio.sleep(0)
+            return True
+        writer.write(frame)
+        return True
+
+
+async def measure_round_trips(count: int, faults: Faults) -> dict:
+    """Measures AioPresence.update round trips against a mock server
+
+    Args:
+        count (int): Updates to send
+        faults (Faults): Faults to inject
+
+    Returns:
+        dict: {count, errors, p50_ms, p90_ms, p99_ms, max_ms}
+    """
+    from patchedPypresence.presence import AioPresence
+
+    path = os.path.join(tempfile.mkdtemp(), "discord-ipc-0")
+    async with MockDiscord(path) as server:
+        rpc = AioPresence(
+            "0", loop=asyncio.get_running_loop(), ipc_path=path, response_timeout=1
+        )
+        await rpc.connect()
+        server.faults = faults
+        timings = []
+        errors = 0
+        for index in range(count):
+            start = time.perf_counter()
+            try:
+                await rpc.update(state=f"Update {index}", details="Benchmark")
+            except Exception:
+                errors += 1
+                if rpc._reader_task is None or rpc._reader_task.done():
+                    await rpc.connect()
+                continue
+            timings.append((time.perf_counter() - start) * 1000)
+        rpc._close_writer()
+    os.rmdir(os.path.dirname(path))
+
+    timings.sort()
+
+    def percentile(ratio: float) -> float:
+        return timings[min(len(timings) - 1, int(len(timings) * ratio))] if timings else 0.0
+
+    return dict(
+        count=count,
+        errors=errors,
+        p50_ms=percentile(0.5),
+        p90_ms=percentile(0.9),
+        p99_ms=percentile(0.99),
+        max_ms=timings[-1] if timings else 0.0,
+    )
+
+
+async def serve_forever(path: str | None, faults: Faults):
+    async with MockDiscord(path, faults) as server:
+        print(f"Mock Discord listening on {server.path}")
+        seen = 0
+        while True:
+            await asyncio.sleep(0.2)
+            for frame in server.received[seen:]:
+                print(f"#{frame.client} op={frame.op} {json.dumps(frame.payload)}")
+            seen = len(server.received)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", help="socket path, defaults to the first Discord IPC path")
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-after", type=int)
+    parser.add_argument("--chunk-size", type=int, default=0, help="write responses in pieces of this many bytes")
+    parser.add_argument("--reject-handshake", action="store_true")
+    parser.add_argument("--bench", type=int, metavar="COUNT", help="measure COUNT update round trips and exit")
+    args = parser.parse_args()
+    faults = Faults(
+        delay=args.delay,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        disconnect_after=args.disconnect_after,
+        chunk_size=args.chunk_size,
+        reject_handshake=args.reject_handshake,
+    )
+    if args.bench:
+        print(json.dumps(asyncio.run(measure_round_trips(args.bench, faults)), indent=2))
+    else:
+        try:
+            asyncio.run(serve_forever(args.path, faults))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
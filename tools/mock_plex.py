@@ -0,0 +1,497 @@
+"""Stand-in for a Plex server and the artwork providers, serving recorded fixtures
+
+    python -m tools.mock_plex                         # Plex on 32500, providers on 32501-32504
+    python -m tools.mock_plex --sessions 500 --users 50 --latency 0.05 --error-rate 0.01
+
+Prints the config.json settings pointing the script at the stand-ins.
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+SERVICES = ["plex", "tvdb", "fanarttv", "musicbrainz", "coverartarchive"]
+BASE_PATHS = {  # path prefix of each service, as in the real URLs
+    "plex": "",
+    "tvdb": "/v4",
+    "fanarttv": "/v3",
+    "musicbrainz": "/ws/2",
+    "coverartarchive": "",
+}
+KEEPALIVE = 15  # seconds between two pings on the notification stream
+
+
+def load_fixture(name: str) -> dict:
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json")) as f:
+        return json.load(f)
+
+
+def stable_id(*parts) -> int:
+    """Deterministic number derived from names, for synthetic ids"""
+    digest = hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16)
+
+
+def stable_mbid(*parts) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "|".join(map(str, parts)).casefold()))
+
+
+@dataclass
+class Behaviour:
+    """Latency and failures injected by a stand-in, can be changed while it runs"""
+
+    latency: float = 0.0  # seconds added to every response
+    jitter: float = 0.0  # extra random latency, up to this many seconds
+    error_rate: float = 0.0  # ratio of requests answered with error_status
+    error_status: int = 503
+
+    def apply(self) -> bool:
+        """Sleeps the injected latency, returns True if the request should fail"""
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        return random.random() < self.error_rate
+
+
+class PlexState:
+    """Sessions, libraries and metadata served by the Plex stand-in
+
+    Sessions can be edited from another thread (e.g.: to pause or seek), and
+    notify() pushes the matching notification to the open event streams.
+    """
+
+    def __init__(self):
+        fixture = load_fixture("plex")
+        self.libraries: list[dict] = fixture["libraries"]
+        self.sessions: list[dict] = fixture["sessions"]
+        self.metadata: dict[str, dict] = fixture["metadata"]
+        self.lock = threading.Lock()
+        self._streams: list[queue.Queue] = []
+
+    def generate_sessions(
+        self, count: int, users: int = 1, libraries: int = 1, start: int = 0
+    ):
+        """Replaces the sessions by count synthetic ones spread over users and libraries
+
+        The fixture sessions are used as templates, each synthetic media gets its own
+        ratingKey and metadata so that every session needs its own artwork lookup.
+        Media are numbered from start, generate again from the previous count to get
+        media never served before.
+        """
+        templates = load_fixture("plex")["sessions"]
+        sessions = []
+        for index in range(start, start + count):
+            session = copy.deepcopy(templates[index % len(templates)])
+            number = index // len(templates)
+            rating_key = str(100000 + index)
+            session["sessionKey"] = str(index - start + 1)
+            session["ratingKey"] = rating_key
+            session["User"] = {"id": str(index % users + 1), "title": f"user{index % users + 1}"}
+            session["Player"]["machineIdentifier"] = f"player-{index}"
+            session["librarySectionTitle"] = (
+                f"{session['librarySectionTitle']} {index % libraries + 1}"
+                if libraries > 1
+                else session["librarySectionTitle"]
+            )
+            session["viewOffset"] = random.randrange(session["duration"])
+            if session["type"] == "episode":
+                session["grandparentTitle"] = f"{session['grandparentTitle']} {number}"
+                session["grandparentRatingKey"] = str(200000 + index)
+                self.add_metadata(session["grandparentRatingKey"], "show", session["grandparentTitle"])
+            elif session["type"] == "track":
+                session["grandparentTitle"] = f"{session['grandparentTitle']} {number}"
+                session["parentTitle"] = f"{session['parentTitle']} {number}"
+            elif session["type"] == "movie":
+                session["title"] = f"{session['title']} {number}"
+            self.add_metadata(rating_key, session["type"], session["title"])
+            sessions.append(session)
+
+        with self.lock:
+            self.sessions = sessions
+            self.libraries = [
+                {"key": str(key), "title": title, "type": kind}
+                for key, (title, kind) in enumerate(
+                    sorted({(s["librarySectionTitle"], s["type"]) for s in sessions}), 1
+                )
+            ]
+
+    def add_metadata(self, rating_key: str, kind: str, title: str):
+        self.metadata[rating_key] = {
+            "ratingKey": rating_key,
+            "type": kind,
+            "title": title,
+            "Guid": [{"id": f"imdb://tt{9000000 + stable_id(title) % 1000000:07d}"}],
+        }
+
+    def notify(self, session_key: str):
+        """Pushes the current state of a session to the notification streams"""
+        with self.lock:
+            session = next(
+                (s for s in self.sessions if str(s["sessionKey"]) == str(session_key)), None
+            )
+            notification = {
+                "sessionKey": str(session_key),
+                "state": session["Player"]["state"] if session else "stopped",
+            }
+            if session:
+                notification["ratingKey"] = session["ratingKey"]
+                notification["viewOffset"] = session["viewOffset"]
+            streams = list(self._streams)
+        for stream in streams:
+            stream.put({"PlaySessionStateNotification": [notification]})
+
+    def open_stream(self) -> queue.Queue:
+        stream = queue.Queue()
+        with self.lock:
+            self._streams.append(stream)
+        return stream
+
+    def close_stream(self, stream: queue.Queue):
+        with self.lock:
+            self._streams.remove(stream)
+
+
+class ProviderState:
+    """Reference data of the artwork providers, unknown media get deterministic synthetic answers"""
+
+    def __init__(self, synthesize: bool = True):
+        fixture = load_fixture("providers")
+        self.tvdb = fixture["tvdb"]
+        self.musicbrainz = fixture["musicbrainz"]
+        self.fanarttv = fixture["fanarttv"]
+        self.coverartarchive = fixture["coverartarchive"]
+        self.synthesize = synthesize
+        self.revoked_tokens: set[str] = set()  # TVDB bearers answered with a 401
+
+    def tvdb_remoteid(self, imdb_id: str) -> list:
+        found = self.tvdb["remoteids"].get(imdb_id)
+        if found is None and self.synthesize and imdb_id.startswith("tt9"):
+            found = {"id": stable_id(imdb_id)}
+        if found is None:
+            return []
+        # The search answers both kinds, the app picks the one it expects
+        return [{kind: {"id": found["id"]} for kind in ["series", "movie"]}]
+
+    def tvdb_item(self, kind: str, tvdb_id: str) -> dict | None:
+        item = self.tvdb[kind].get(tvdb_id)
+        if item is None and self.synthesize:
+            item = {
+                "id": int(tvdb_id),
+                "image": f"https://artworks.thetvdb.com/banners/{kind}/{tvdb_id}/posters/{tvdb_id}.jpg",
+            }
+        return item
+
+    def artist(self, name: str) -> dict | None:
+        artist = self.musicbrainz["artists"].get(name.casefold())
+        if artist is None and self.synthesize:
+            artist = {"id": stable_mbid("artist", name), "name": name, "score": 100}
+        return artist
+
+    def release(self, title: str, artist: str | None) -> dict | None:
+        release = self.musicbrainz["releases"].get(title.casefold())
+        if release is None and self.synthesize:
+            release = {"id": stable_mbid("release", title), "title": title, "packaging": "Jewel Case", "score": 100}
+            if artist:
+                release["artist-credit"] = [
+                    {"name": artist, "artist": {"id": stable_mbid("artist", artist), "name": artist}}
+                ]
+        return release
+
+    def artist_images(self, mbid: str) -> dict | None:
+        images = self.fanarttv.get(mbid)
+        if images is None and self.synthesize:
+            url = f"https://assets.fanart.tv/fanart/music/{mbid}/artistthumb/{mbid[:8]}.jpg"
+            images = {"mbid_id": mbid, "artistthumb": [{"url": url}]}
+        return images
+
+    def cover(self, mbid: str) -> str | None:
+        cover = self.coverartarchive.get(mbid)
+        if cover is None and self.synthesize:
+            cover = f"http://coverartarchive.org/release/{mbid}/{stable_id(mbid)}.jpg"
+        return cover
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Routes the requests of one service, see StandIns"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, don't let delayed ACKs stall them
+    disable_nagle_algorithm = True
+    service: str = ""
+    stand_ins: "StandIns" = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method: str):
+        stand_ins = self.stand_ins
+        stand_ins.count(self.service)
+        if stand_ins.behaviours[self.service].apply():
+            return self._send(stand_ins.behaviours[self.service].error_status, {"error": "Injected error"})
+
+        url = urlsplit(self.path)
+        path = url.path[len(BASE_PATHS[self.service]) :]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = None
+        if method == "POST":
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"null")
+        route = getattr(self, f"_{self.service}")
+        route(method, path, query, body)
+
+    def _send(self, status: int, payload=None, headers: dict | None = None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _plex(self, method, path, query, body):
+        plex = self.stand_ins.plex
+        if "X-Plex-Token" not in query:
+            return self._send(401, {"errors": [{"code": 1001, "message": "User could not be authenticated"}]})
+        if path == "/status/sessions":
+            with plex.lock:
+                sessions = copy.deepcopy(plex.sessions)
+            return self._send(200, {"MediaContainer": {"size": len(sessions), "Metadata": sessions}})
+        if path == "/:/eventsource/notifications":
+            return self._stream_notifications()
+        if path == "/library/sections":
+            return self._send(200, {"MediaContainer": {"size": len(plex.libraries), "Directory": plex.libraries}})
+        if path.startswith("/library/sections/") and path.endswith("/all"):
+            key = path.split("/")[3]
+            library = next((l for l in plex.libraries if l["key"] == key), None)
+            if library is None:
+                return self._send(404)
+            with plex.lock:
+                items = [
+                    plex.metadata.get(s["ratingKey"], {"ratingKey": s["ratingKey"]})
+                    for s in plex.sessions
+                    if s["librarySectionTitle"] == library["title"]
+                ]
+            return self._send(200, {"MediaContainer": {"size": len(items), "Metadata": items}})
+        if path.startswith("/library/metadata/"):
+            rating_key = path.split("/")[3]
+            item = plex.metadata.get(rating_key)
+            if item is None and self.stand_ins.providers.synthesize:
+                # e.g. media of a recorded timeline
+                plex.add_metadata(rating_key, "unknown", rating_key)
+                item = plex.metadata[rating_key]
+            if item is None:
+                return self._send(404)
+            return self._send(200, {"MediaContainer": {"size": 1, "Metadata": [item]}})
+        self._send(404)
+
+    def _stream_notifications(self):
+        plex = self.stand_ins.plex
+        stream = plex.open_stream()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        # Like Plex, each event in its own chunk
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while not self.stand_ins.stopped.is_set():
+                try:
+                    notification = stream.get(timeout=KEEPALIVE)
+                    message = f"event: playing\ndata: {json.dumps(notification)}\n\n"
+                except queue.Empty:
+                    message = "event: ping\ndata: {}\n\n"
+                data = message.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            plex.close_stream(stream)
+
+    def _tvdb(self, method, path, query, body):
+        providers = self.stand_ins.providers
+        if path == "/login" and method == "POST":
+            token = f"header.{stable_id((body or {}).get('apikey'))}.signature"
+            return self._send(200, {"status": "success", "data": {"token": token}})
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer ") or (
+            authorization[len("Bearer "):] in providers.revoked_tokens
+        ):
+            return self._send(401, {"status": "failure", "message": "Unauthorized"})
+        parts = path.strip("/").split("/")
+        if parts[:2] == ["search", "remoteid"] and len(parts) == 3:
+            return self._send(200, {"status": "success", "data": providers.tvdb_remoteid(parts[2])})
+        if len(parts) == 2 and parts[0] in ["series", "movies"]:
+            item = providers.tvdb_item(parts[0], parts[1])
+            if item is None:
+                return self._send(404, {"status": "failure", "message": "NotFoundException"})
+            return self._send(200, {"status": "success", "data": item})
+        self._send(404, {"status": "failure"})
+
+    def _musicbrainz(self, method, path, query, body):
+        providers = self.stand_ins.providers
+        search = unquote(query.get("query", ""))
+        if path == "/artist":
+            artist = providers.artist(search)
+            return self._send(200, {"count": int(bool(artist)), "artists": [artist] if artist else []})
+        if path == "/release":
+            fields = {}
+            for term in search.split(" AND "):
+                field, _, value = term.partition(":")
+                fields[field] = value.replace("\\", "")
+            artist = fields.get("artist")
+            if "arid" in fields:
+                artist = next(
+                    (a["name"] for a in providers.musicbrainz["artists"].values() if a["id"] == fields["arid"]),
+                    None,
+                )
+            release = providers.release(fields.get("release", ""), artist)
+            return self._send(200, {"count": int(bool(release)), "releases": [release] if release else []})
+        self._send(404, {"error": "Not Found"})
+
+    def _fanarttv(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        images = self.stand_ins.providers.artist_images(parts[1]) if parts[0] == "music" else None
+        if images is None:
+            return self._send(404, {"status": "error", "error message": "Not found"})
+        self._send(200, images)
+
+    def _coverartarchive(self, method, path, query, body):
+        parts = path.strip("/").split("/")
+        cover = (
+            self.stand_ins.providers.cover(parts[1])
+            if len(parts) == 3 and parts[0] == "release" and parts[2] == "front"
+            else None
+        )
+        if cover is None:
+            return self._send(404)
+        self._send(307, headers={"Location": cover})
+
+
+class StandIns:
+    """Plex and artwork provider stand-ins, each on its own port so that the
+    per-host rate limits and circuit breakers of the app behave as in production"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, synthesize: bool = True):
+        """
+        Args:
+            host (str, optional): Address to listen on. Defaults to 127.0.0.1.
+            port (int, optional): Port of Plex, providers use the next ones. Defaults to 0 (any free ports).
+            synthesize (bool, optional): Answer for media missing from the fixtures. Defaults to True.
+        """
+        self.host = host
+        self.port = port
+        self.plex = PlexState()
+        self.providers = ProviderState(synthesize)
+        self.behaviours = {service: Behaviour() for service in SERVICES}
+        self.requests: dict[str, int] = {service: 0 for service in SERVICES}
+        self.stopped = threading.Event()
+        self._servers: dict[str, ThreadingHTTPServer] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> dict[str, str]:
+        """Starts every stand-in
+
+        Returns:
+            dict: Base URL per service
+        """
+        for offset, service in enumerate(SERVICES):
+            handler = type(
+                f"{service.title()}Handler",
+                (StandInHandler,),
+                dict(service=service, stand_ins=self),
+            )
+            port = self.port + offset if self.port else 0
+            server = ThreadingHTTPServer((self.host, port), handler)
+            server.daemon_threads = True
+            threading.Thread(
+                target=server.serve_forever, name=f"mock-{service}", daemon=True
+            ).start()
+            self._servers[service] = server
+        return self.urls
+
+    def stop(self):
+        self.stopped.set()
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def urls(self) -> dict[str, str]:
+        return {
+            service: f"http://{self.host}:{server.server_address[1]}{BASE_PATHS[service]}"
+            for service, server in self._servers.items()
+        }
+
+    def get_config(self) -> dict:
+        """Settings of config.json pointing the script at the stand-ins"""
+        urls = self.urls
+        return {
+            "plex_url": urls["plex"],
+            "provider_urls": {service: urls[service] for service in SERVICES[1:]},
+        }
+
+    def count(self, service: str):
+        with self._lock:
+            self.requests[service] += 1
+
+    def set_behaviour(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0):
+        """Applies the same latency and error rate to every stand-in"""
+        for service in SERVICES:
+            self.behaviours[service] = Behaviour(latency, jitter, error_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=32500, help="Plex port, providers use the next 4")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--sessions", type=int, help="serve this many synthetic sessions")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--libraries", type=int, default=1)
+    args = parser.parse_args()
+
+    stand_ins = StandIns(args.host, args.port)
+    stand_ins.set_behaviour(args.latency, args.jitter, args.error_rate)
+    if args.sessions:
+        stand_ins.plex.generate_sessions(args.sessions, args.users, args.libraries)
+    stand_ins.start()
+    print(json.dumps(stand_ins.get_config(), indent=2))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stand_ins.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Replays a Plex sessions recording through the update pipeline, against the stand-ins
+
+    python -m tools.replay sessions.jsonl.gz                 # as fast as possible
+    python -m tools.replay sessions.jsonl.gz --speed 100     # 100 times faster than real time
+    python -m tools.replay sessions.jsonl.gz --speed 1       # real time
+
+Record with "record_sessions": "sessions.jsonl.gz" in config.json. The replay runs
+main.poll_plex and main.write_discord on a virtual clock, serving at each moment the
+last response recorded before it, and counts the Discord updates and provider calls.
+With a speed, the real time spent working is sped up as well, the counts are only
+reproducible from one run to another without it.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from tools.bench import write_config
+from tools.mock_discord import MockDiscord
+from tools.mock_plex import StandIns
+
+# Modules reading the time
+CLOCK_MODULES = ["main", "utils.scheduler", "utils.cache", "utils.playback", "utils.timers"]
+DRAIN = 30  # virtual seconds replayed after the last response
+
+
+class VirtualClock:
+    """Time seen by the pipeline, starting at the first recorded response
+
+    With a speed, virtual time runs that many times faster than real time. Without,
+    it jumps to the next timer whenever the event loop has nothing to do.
+    """
+
+    def __init__(self, start: float, speed: float | None = None):
+        self.start = start
+        self.speed = speed
+        self._origin = time.monotonic()
+        self._skipped = 0.0
+
+    def monotonic(self) -> float:
+        return (time.monotonic() - self._origin) * (self.speed or 1) + self._skipped
+
+    def time(self) -> float:
+        return self.start + self.monotonic()
+
+    def skip(self, seconds: float):
+        self._skipped += seconds
+
+    def __getattr__(self, name):
+        # perf_counter, sleep... stay real
+        return getattr(time, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Event loop scheduling timers on a VirtualClock
+
+    Executor jobs run inline so that no work is in flight while the clock jumps.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+        select = self._selector.select
+
+        def virtual_select(timeout=None):
+            if clock.speed:
+                return select(None if timeout is None else timeout / clock.speed)
+            events = select(0)
+            if events or timeout is None or timeout <= 0:
+                return events or select(timeout)
+            clock.skip(timeout)
+            return []
+
+        self._selector.select = virtual_select
+
+    def time(self) -> float:
+        return self.clock.monotonic()
+
+    def run_in_executor(self, executor, func, *args):
+        future = self.create_future()
+        try:
+            future.set_result(func(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+class Timeline:
+    """Recorded /status/sessions responses, served according to the virtual clock"""
+
+    def __init__(self, records: list[tuple[float, int, str]], clock: VirtualClock):
+        self.records = records
+        self.timestamps = [record[0] for record in records]
+        self.clock = clock
+        self.served = 0
+
+    @property
+    def end(self) -> float:
+        return self.timestamps[-1]
+
+    def get_activity(self, *args, **kwargs) -> dict:
+        """Replacement of plex.get_activity"""
+        index = max(0, bisect.bisect_right(self.timestamps, self.clock.time()) - 1)
+        _, code, body = self.records[index]
+        self.served += 1
+        return dict(data=json.loads(body), code=code)
+
+
+async def replay(records: list, speed: float | None, stand_ins: StandIns, directory: str) -> dict:
+    loop = asyncio.get_running_loop()
+    clock = loop.clock
+
+    import main
+    from utils import plex
+    from utils.fanout import FanoutPresence
+
+    timeline = Timeline(records, clock)
+    get_activity = plex.get_activity
+    plex.get_activity = timeline.get_activity
+    for name in CLOCK_MODULES:
+        sys.modules[name].time = clock
+
+    try:
+        async with MockDiscord(os.path.join(directory, "discord-ipc-0")) as discord:
+            pipeline = main.Pipeline(FanoutPresence("0", loop=loop))
+            tasks = [
+                asyncio.create_task(main.write_discord(pipeline)),
+                asyncio.create_task(main.poll_plex(pipeline, None)),
+            ]
+            started = time.perf_counter()
+            while clock.time() < timeline.end + DRAIN:
+                await asyncio.sleep(1)
+            elapsed = time.perf_counter() - started
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            pipeline.rpc.close()
+            activities = discord.activities()
+    finally:
+        # Leave the modules as found, e.g. for the tests replaying several recordings
+        plex.get_activity = get_activity
+        for name in CLOCK_MODULES:
+            sys.modules[name].time = time
+
+    return dict(
+        responses=len(records),
+        distinct_responses=len({record[2] for record in records}),
+        polls=timeline.served,
+        virtual_seconds=round(timeline.end + DRAIN - records[0][0], 1),
+        real_seconds=round(elapsed, 2),
+        speed=speed,
+        discord_updates=len(activities),
+        discord_clears=activities.count(None),
+        skipped_updates=pipeline.scheduler.skipped,
+        coalesced_updates=pipeline.scheduler.coalesced,
+        provider_calls={
+            service: count for service, count in stand_ins.requests.items() if service != "plex"
+        },
+        plex_metadata_calls=stand_ins.requests["plex"],
+    )
+
+
+def run(path: str, speed: float | None) -> dict:
+    from utils.recording import read_recording
+
+    records = list(read_recording(path))
+    if not records:
+        raise SystemExit(f"{path} holds no response")
+
+    stand_ins = StandIns()
+    stand_ins.start()
+    directory = tempfile.mkdtemp(prefix="plex-rpc-replay-")
+    os.chdir(directory)
+    os.environ["XDG_RUNTIME_DIR"] = directory
+    write_config(directory, stand_ins, rate_limits=False)
+
+    loop = VirtualTimeLoop(VirtualClock(records[0][0], speed))
+    try:
+        return loop.run_until_complete(replay(records, speed, stand_ins, directory))
+    finally:
+        loop.close()
+        stand_ins.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="file written with the record_sessions setting")
+    parser.add_argument("--speed", type=float, help="times faster than real time, as fast as possible if not set")
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    recording = os.path.abspath(args.recording)
+    output = os.path.abspath(args.output) if args.output else None
+    logging.disable(logging.CRITICAL)
+    results = run(recording, args.speed)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,80 @@
-import json
-import os
 import requests
 
-from config import tvdb_apikey, fanarttv_apikey
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable
+
+from config import tvdb_apikey, fanarttv_apikey, rate_limits, provider_urls
 from utils.plex import get_imdb_id
-from datetime import datetime
 
+from utils import http
+from utils.bearer import TokenManager
 from utils.logger import setup_logger
-from utils.cache import get_cached_data, set_cached_data
+from utils.cache import get_or_fetch, get_identity, set_identity, normalize_key
 
-TVDB_URL = "https://api4.thetvdb.com/v4"
-FANARTTV_URL = "https://webservice.fanart.tv/v3"
-MBID_URL = "https://musicbrainz.org/ws/2"
-COVERART_URL = "https://coverartarchive.org"
+TVDB_URL = provider_urls.get("tvdb", "https://api4.thetvdb.com/v4")
+FANARTTV_URL = provider_urls.get("fanarttv", "https://webservice.fanart.tv/v3")
+MBID_URL = provider_urls.get("musicbrainz", "https://musicbrainz.org/ws/2")
+COVERART_URL = provider_urls.get("coverartarchive", "https://coverartarchive.org")
 WILDCARDS = ["?", "*"]
 APP_HEADER = "DiscordRPC/v0.0.1"
+NOT_FOUND_ERRORS = (KeyError, IndexError, TypeError)  # provider answered without a match
 LOGGER = setup_logger(__name__)
+RESOLVER_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="art")
+RATE_LIMITS = {  # requests per second
+    "musicbrainz": 1,
+    "coverartarchive": 5,
+    "fanarttv": 5,
+    "tvdb": 10,
+    **rate_limits,
+}
+
+http.set_rate_limit(MBID_URL, RATE_LIMITS["musicbrainz"])
+http.set_rate_limit(COVERART_URL, RATE_LIMITS["coverartarchive"])
+http.set_rate_limit(FANARTTV_URL, RATE_LIMITS["fanarttv"])
+http.set_rate_limit(TVDB_URL, RATE_LIMITS["tvdb"])
+for provider_url in [MBID_URL, COVERART_URL, FANARTTV_URL, TVDB_URL]:
+    http.set_circuit_breaker(provider_url)
+
+TVDB_TOKEN = TokenManager(
+    login=lambda: get_bearer()["data"]["token"], path="./token_bearer.json"
+)
+
+
+def resolve_artworks(
+    needs: dict[str, tuple[Callable[..., str | None], dict]], timeout: float
+) -> dict[str, str]:
+    """Resolves several artworks concurrently (e.g.: album cover and artist picture)
+
+    Lookups still running when the timeout expires are left to finish in the
+    background so that their result lands in the cache for the next update.
+
+    Args:
+        needs (dict): {name: (function, kwargs)}, e.g.: {"artist": (get_artist_picture, {"artist_name": "Muse"})}
+        timeout (float): Maximum time to wait in seconds
+
+    Returns:
+        dict: {name: URL} of the artworks found in time
+    """
+    futures = {
+        RESOLVER_POOL.submit(function, **kwargs): name
+        for name, (function, kwargs) in needs.items()
+    }
+    done, not_done = wait(futures, timeout=timeout)
+    if not_done:
+        LOGGER.warning(
+            f"⚠️ Artwork not resolved in time: {', '.join(futures[f] for f in not_done)}"
+        )
+
+    results = {}
+    for future in done:
+        try:
+            url = future.result()
+        except Exception as error:
+            LOGGER.error(f"❌ Error while resolving {futures[future]} artwork: {error}")
+            continue
+        if url:
+            results[futures[future]] = url
+    return results
 
 
 def get_artist_picture(artist_name: str) -> str | None:
@@ -27,30 +86,43 @@ def get_artist_picture(artist_name: str) -> str | None:
     Returns:
         str: URL of the picture
     """
-    cache_key = f"artist_picture_{artist_name}"
-    cached_data = get_cached_data(cache_key)
-    if cached_data:
-        return cached_data
+    try:
+        return get_or_fetch(
+            "artist_picture", artist_name, lambda: fetch_artist_picture(artist_name)
+        )
+    except http.CircuitOpenError as error:
+        LOGGER.debug(f"Skipping {artist_name} picture: {error}")
+        return None
+    except requests.exceptions.RequestException as error:
+        LOGGER.error(f"❌ Error while fetching {artist_name} picture: {error}")
+        return None
+
+
+def fetch_artist_picture(artist_name: str) -> str | None:
+    """Calls MusicBrainz then fanart.tv to get the picture of an artist, bypassing the cache
+
+    Args:
+        artist_name (str): Name of the artist to get picture
+
+    Raises:
+        requests.exceptions.RequestException: The lookup failed and should be retried
 
+    Returns:
+        str: URL of the picture, None if the artist or picture doesn't exist
+    """
     LOGGER.debug(f"Fetching {artist_name} picture")
     try:
-        id_url = f"{MBID_URL}/artist?query={artist_name}"
         headers = {"accept": "application/json", "User-Agent": APP_HEADER}
-        request = requests.get(url=id_url, headers=headers)
-        data = request.json()
-        artist_id = data["artists"][0]["id"]
+        artist_id = get_artist_mbid(artist_name)
 
         pic_url = f"{FANARTTV_URL}/music/{artist_id}?api_key={fanarttv_apikey}"
-        request = requests.get(url=pic_url, headers=headers)
+        request = check_response(http.get(url=pic_url, headers=headers))
         data = request.json()
         if data.get("artistthumb"):
             pic_url = data["artistthumb"][0]["url"]
         else:
             pic_url = data["artistbackground"][0]["url"]
-
-        set_cached_data(cache_key, pic_url)
-    except requests.exceptions.RequestException as error:
-        LOGGER.error(f"❌ Error while fetching {artist_name} picture: {error}")
+    except NOT_FOUND_ERRORS:
         return None
 
     return pic_url
@@ -73,17 +145,18 @@ def get_item_cover(
         LOGGER.error(f"❌ {media_type} is not a supported media type")
         return None
 
-    cache_key = f"cover_{media_type}_{media_name}_{plex_item_id}_{media_artist}"
-    cached_data = get_cached_data(cache_key)
-    if cached_data:
-        return cached_data
-
-    res_url = get_media_art(media_name, media_type, plex_item_id, media_artist)
-
-    if res_url:
-        set_cached_data(cache_key, res_url)
-
-    return res_url if res_url else None
+    try:
+        return get_or_fetch(
+            f"cover_{media_type}",
+            f"{media_name}_{plex_item_id}_{media_artist}",
+            lambda: get_media_art(media_name, media_type, plex_item_id, media_artist),
+        )
+    except http.CircuitOpenError as error:
+        LOGGER.debug(f"Skipping {media_name} cover: {error}")
+        return None
+    except requests.exceptions.RequestException as error:
+        LOGGER.error(f"❌ Error while getting {media_name} cover: {error}")
+        return None
 
 
 def get_album_cover(mbid_id: str) -> str | None:
@@ -96,7 +169,7 @@ def get_album_cover(mbid_id: str) -> str | None:
         str: URL of the album cover
     """
     url = f"{COVERART_URL}/release/{mbid_id}/front"
-    request = requests.get(url=url, allow_redirects=False)
+    request = check_response(http.get(url=url, allow_redirects=False))
     return request.headers.get("Location", None)
 
 
@@ -110,61 +183,143 @@ def get_media_art(
         media_type (str): The type of the media (tv, movie, music)
         media_artist (str, optional): The artist in the case of an album. Defaults to None.
 
+    Raises:
+        requests.exceptions.RequestException: The lookup failed and should be retried
+
     Returns:
-        str: id of the media
+        str: URL of the cover, None if the media or its cover doesn't exist
     """
-    media_id = ""
     url = None
     res_url = None
-    headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {tvdb_login()}",
-            "User-Agent": APP_HEADER,
-        }
 
     if media_name:
         media_name = wildcard_security(media_name)
 
-    if media_type == "tv":
-        imdb_id = get_imdb_id(plex_item_id)
-        res = requests.get(url=f"{TVDB_URL}/search/remoteid/{imdb_id}", headers=headers)
-        tvdb_id = res.json()["data"][0]["series"]["id"]
-        url = f"{TVDB_URL}/series/{tvdb_id}"
-    elif media_type == "movies":
-        imdb_id = get_imdb_id(plex_item_id)
-        res = requests.get(url=f"{TVDB_URL}/search/remoteid/{imdb_id}", headers=headers)
-        tvdb_id = res.json()["data"][0]["movie"]["id"]
-        url = f"{TVDB_URL}/movies/{tvdb_id}"
-    elif media_type == "music":
-        if media_artist:
-            url = f"{MBID_URL}/release?query=artist:{media_artist}%20AND%20release:{media_name}"
-        else:
-            url = f"{MBID_URL}/release?query=release:{media_name}"
     try:
-        encoded_url = requests.utils.requote_uri(url)
-        request = requests.get(url=encoded_url, headers=headers)
-        data = request.json()
-
-        if media_type in ["tv", "movies"]:
-            res_url = data["data"]["image"]
+        if media_type == "tv":
+            tvdb_id = get_tvdb_id(get_imdb_id(plex_item_id), "series")
+            url = f"{TVDB_URL}/series/{tvdb_id}"
+        elif media_type == "movies":
+            tvdb_id = get_tvdb_id(get_imdb_id(plex_item_id), "movie")
+            url = f"{TVDB_URL}/movies/{tvdb_id}"
         elif media_type == "music":
-            for release in data["releases"]:
-                if wildcard_security(
-                    release["title"]
-                ).lower() == media_name.lower() and release.get("packaging") in [
-                    "None",
-                    "Jewel Case",
-                ]:
-                    media_id = release["id"]
-                    break
-            media_id = data["releases"][0]["id"]
-            res_url = get_album_cover(media_id)
-    except requests.exceptions.RequestException as error:
-        LOGGER.error(f"❌ Error while getting {media_name} id: {error}")
+            return get_album_cover(get_release_mbid(media_name, media_artist))
+
+        res_url = tvdb_get(url).json()["data"]["image"]
+    except NOT_FOUND_ERRORS:
+        LOGGER.debug(f"No cover found for {media_name}")
         res_url = None
     return res_url
 
 
+def get_tvdb_id(imdb_id: str, kind: str) -> str:
+    """Gets the TVDB id of a show or movie from its IMDb id, resolved once and stored
+
+    Args:
+        imdb_id (str): IMDb id (e.g.: tt0216651)
+        kind (str): series or movie
+
+    Returns:
+        str: TVDB id
+    """
+    tvdb_id = get_identity(f"tvdb_{kind}", imdb_id)
+    if tvdb_id:
+        return tvdb_id
+
+    res = tvdb_get(f"{TVDB_URL}/search/remoteid/{imdb_id}")
+    tvdb_id = res.json()["data"][0][kind]["id"]
+    set_identity(f"tvdb_{kind}", imdb_id, tvdb_id)
+    return str(tvdb_id)
+
+
+def get_artist_mbid(artist_name: str) -> str:
+    """Gets the MusicBrainz id of an artist from their name, resolved once and stored
+
+    Args:
+        artist_name (str): Name of the artist
+
+    Returns:
+        str: Artist MBID
+    """
+    artist_id = get_identity("musicbrainz_artist", artist_name)
+    if artist_id:
+        return artist_id
+
+    headers = {"accept": "application/json", "User-Agent": APP_HEADER}
+    url = requests.utils.requote_uri(f"{MBID_URL}/artist?query={artist_name}")
+    request = check_response(http.get(url=url, headers=headers))
+    artist_id = request.json()["artists"][0]["id"]
+    set_identity("musicbrainz_artist", artist_name, artist_id)
+    return artist_id
+
+
+def get_release_mbid(media_name: str, media_artist=None) -> str:
+    """Gets the MusicBrainz id of an album, resolved once and stored
+
+    Searches by artist MBID when the artist is already known, and learns the
+    artist MBID from the release found otherwise.
+
+    Args:
+        media_name (str): Name of the album, wildcards escaped
+        media_artist (str, optional): The artist of the album. Defaults to None.
+
+    Returns:
+        str: Release MBID
+    """
+    release_key = f"{media_artist}|{media_name}"
+    release_id = get_identity("musicbrainz_release", release_key)
+    if release_id:
+        return release_id
+
+    artist_id = get_identity("musicbrainz_artist", media_artist) if media_artist else None
+    if artist_id:
+        url = f"{MBID_URL}/release?query=arid:{artist_id}%20AND%20release:{media_name}"
+    elif media_artist:
+        url = f"{MBID_URL}/release?query=artist:{media_artist}%20AND%20release:{media_name}"
+    else:
+        url = f"{MBID_URL}/release?query=release:{media_name}"
+
+    headers = {"accept": "application/json", "User-Agent": APP_HEADER}
+    request = check_response(http.get(url=requests.utils.requote_uri(url), headers=headers))
+    releases = request.json()["releases"]
+
+    release = releases[0]
+    for candidate in releases:
+        if wildcard_security(
+            candidate["title"]
+        ).lower() == media_name.lower() and candidate.get("packaging") in [
+            "None",
+            "Jewel Case",
+        ]:
+            release = candidate
+            break
+
+    set_identity("musicbrainz_release", release_key, release["id"])
+    if media_artist and not artist_id:
+        for credit in release.get("artist-credit", []):
+            if normalize_key(credit.get("name", "")) == normalize_key(media_artist):
+                set_identity("musicbrainz_artist", media_artist, credit["artist"]["id"])
+                break
+    return release["id"]
+
+
+def check_response(response: requests.Response) -> requests.Response:
+    """Raises on rate limiting and server errors so they aren't cached as missing
+
+    Args:
+        response (requests.Response): Response of a provider
+
+    Raises:
+        requests.exceptions.HTTPError: The provider answered 429 or 5xx
+
+    Returns:
+        requests.Response: The same response
+    """
+    if response.status_code == 429 or response.status_code >= 500:
+        response.raise_for_status()
+    return response
+
+
 def wildcard_security(string: str) -> str:
     """Puts backslash in case of wildcard (for example: ? by XXXTENTACION)
 
@@ -184,27 +339,12 @@ def wildcard_security(string: str) -> str:
 
 
 def tvdb_login() -> str:
-    """Gets TVDB token stored locally or calls to generate a new one
+    """Gets the TVDB token, kept in memory and refreshed in the background before it expires
 
     Returns:
         str: TVDB token
     """
-    if not os.path.isfile("./token_bearer.json"):
-        write_token(token_bearer=get_bearer()["data"]["token"])
-
-    with open("./token_bearer.json", "r") as file:
-        file_data = json.load(file)
-
-    today = datetime.today()
-    token_date = datetime.strptime(file_data["date"], "%d-%m-%Y")
-    time_diff = (today.year - token_date.year) * 12 + (today.month - token_date.month)
-
-    if time_diff >= 1:
-        token = get_bearer()["data"]["token"]
-        write_token(token_bearer=token)
-        return token
-
-    return file_data["token"]
+    return TVDB_TOKEN.get()
 
 
 def get_bearer() -> dict:
@@ -215,19 +355,32 @@ def get_bearer() -> dict:
     """
     headers = {"Content-type": "application/json", "accept": "application/json"}
 
-    request = requests.post(
-        url=f"{TVDB_URL}/login", headers=headers, json={"apikey": tvdb_apikey}
+    request = check_response(
+        http.post(url=f"{TVDB_URL}/login", headers=headers, json={"apikey": tvdb_apikey})
     )
 
     return request.json()
 
 
-def write_token(token_bearer: str):
-    """Writes TVDB token to local file called token_bearer.json
+def tvdb_get(url: str) -> requests.Response:
+    """Calls TVDB with the bearer, logging in again once if the token is rejected
 
     Args:
-        token_bearer (str): The TVDB token to write
+        url (str): TVDB URL
+
+    Returns:
+        requests.Response: TVDB response
     """
-    token = {"token": token_bearer, "date": datetime.today().strftime("%d-%m-%Y")}
-    with open("./token_bearer.json", "w") as file:
-        json.dump(token, file)
+    token = tvdb_login()
+    for _ in range(2):
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {token}",
+            "User-Agent": APP_HEADER,
+        }
+        request = check_response(http.get(url=url, headers=headers))
+        if request.status_code != 401:
+            break
+        LOGGER.warning("⚠️ TVDB token rejected, logging in again")
+        token = TVDB_TOKEN.invalidate(token)
+    return request
@@ -0,0 +1,134 @@
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+
+from datetime import datetime
+from typing import Callable
+
+from utils.logger import setup_logger
+
+TOKEN_LIFETIME = 30 * 86400  # used when the token doesn't tell its expiry
+REFRESH_MARGIN = 2 * 86400  # refresh in the background this long before expiry
+LOGGER = setup_logger(__name__)
+
+
+def get_token_expiry(token: str, issued_at: float) -> float:
+    """Reads the expiry of a JWT from its payload, without verifying it
+
+    Args:
+        token (str): The token
+        issued_at (float): Timestamp of the login, used if the token has no exp claim
+
+    Returns:
+        float: Expiry timestamp
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return issued_at + TOKEN_LIFETIME
+
+
+class TokenManager:
+    """Keeps an API token in memory, persisted to a file and refreshed before it expires"""
+
+    def __init__(self, login: Callable[[], str], path: str):
+        """
+        Args:
+            login (Callable[[], str]): Calls the API to get a new token
+            path (str): File where the token is stored between runs
+        """
+        self.login = login
+        self.path = path
+        self._token = None
+        self._expires = 0.0
+        self._loaded = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self) -> str:
+        """Returns a valid token, logging in only if there's none or it expired
+
+        Returns:
+            str: The token
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+            if self._token is None or time.time() >= self._expires:
+                self._renew()
+            elif time.time() >= self._expires - REFRESH_MARGIN and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(
+                    target=self._refresh, name="token-refresh", daemon=True
+                ).start()
+            return self._token
+
+    def invalidate(self, token: str) -> str:
+        """Replaces a token rejected by the API (e.g.: after a 401)
+
+        Args:
+            token (str): The rejected token, ignored if it was already replaced
+
+        Returns:
+            str: A new token
+        """
+        with self._lock:
+            if token == self._token:
+                self._renew()
+            return self._token
+
+    def _refresh(self):
+        try:
+            token = self.login()
+            with self._lock:
+                self._set(token)
+        except Exception as error:
+            LOGGER.warning(f"⚠️ Failed to refresh token, keeping current one: {error}")
+        finally:
+            self._refreshing = False
+
+    def _renew(self):
+        self._set(self.login())
+
+    def _set(self, token: str):
+        now = time.time()
+        self._token = token
+        self._expires = get_token_expiry(token, now)
+        self._write(now)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as file:
+                file_data = json.load(file)
+            issued_at = datetime.strptime(file_data["date"], "%d-%m-%Y").timestamp()
+        except (OSError, KeyError, ValueError):
+            return
+        token = file_data.get("token")
+        if not token:
+            return
+        self._token = token
+        self._expires = file_data.get("expires") or get_token_expiry(token, issued_at)
+
+    def _write(self, issued_at: float):
+        token = {
+            "token": self._token,
+            "date": datetime.fromtimestamp(issued_at).strftime("%d-%m-%Y"),
+            "expires": self._expires,
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, prefix=".token-", delete=False
+        ) as file:
+            try:
+                json.dump(token, file)
+            except BaseException:
+                file.close()
+                os.remove(file.name)
+                raise
+        os.replace(file.name, self.path)
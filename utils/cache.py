@@ -1,36 +1,333 @@
+import hashlib
 import json
 import os
+import sqlite3
+import threading
 import time
+import unicodedata
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from config import cache_ttl
+from utils.logger import setup_logger
+from utils.throttle import SingleFlight
 
 CACHE_DIR = "cache"
-CACHE_DURATION = 3600  # 1 hour
+CACHE_DB = os.path.join(CACHE_DIR, "cache.db")
+CACHE_DURATION = 3600  # 1 hour, for namespaces without their own TTL
+DAY = 86400
+CACHE_TTLS = {
+    "cover_tv": 7 * DAY,
+    "cover_movies": 30 * DAY,
+    "cover_music": 30 * DAY,
+    "artist_picture": 7 * DAY,
+    "negative": 3600,  # failed lookups
+    **cache_ttl,
+}
+MEMORY_SIZE = 512  # entries kept in memory
+MAX_ENTRIES = 10000  # entries kept on disk
+TRIM_EVERY = 100  # writes between two disk evictions
+
+_memory: OrderedDict[str, tuple[float, object]] = OrderedDict()
+_identities: dict[tuple[str, str], str] = {}
+_lock = threading.Lock()
+_local = threading.local()
+_ready = False
+_writes = 0
+_refreshing = set()
+_stats = dict(hits=0, negative_hits=0, stale=0, misses=0, identity_hits=0, identity_misses=0)
+_in_flight = SingleFlight()
+_refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+LOGGER = setup_logger(__name__)
+
+
+def normalize_key(key: str) -> str:
+    """Normalizes a key so that case, unicode forms and spacing don't matter."""
+    return " ".join(unicodedata.normalize("NFKC", str(key)).casefold().split())
+
+
+def hash_key(key: str) -> str:
+    """Get the storage key for a given key."""
+    return hashlib.sha1(normalize_key(key).encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """Get the database connection of the current thread, creating the store if needed."""
+    global _ready
+    connection = getattr(_local, "connection", None)
+    if connection is not None:
+        return connection
+
+    with _lock:
+        if not _ready:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+        connection = sqlite3.connect(CACHE_DB, timeout=10, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        if not _ready:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, name TEXT, timestamp REAL, data TEXT)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS identities ("
+                "provider TEXT, key TEXT, value TEXT, PRIMARY KEY (provider, key))"
+            )
+            _migrate_json_files(connection)
+            _ready = True
+    _local.connection = connection
+    return connection
+
+
+def _migrate_json_files(connection: sqlite3.Connection) -> None:
+    """Import the entries of the former one file per key cache, then remove the files."""
+    for directory, _, files in os.walk(CACHE_DIR, topdown=False):
+        for file in files:
+            if not file.endswith(".json"):
+                continue
+            path = os.path.join(directory, file)
+            # Keys holding a "/" (e.g.: artist_picture_AC/DC) were written to subdirectories
+            name = os.path.relpath(path, CACHE_DIR)[: -len(".json")].replace(os.sep, "/")
+            try:
+                with open(path, "r") as f:
+                    cache_data = json.load(f)
+                connection.execute(
+                    "INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)",
+                    (
+                        hash_key(name),
+                        normalize_key(name),
+                        cache_data["timestamp"],
+                        json.dumps(cache_data["data"]),
+                    ),
+                )
+            except (OSError, ValueError, KeyError):
+                pass
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if directory != CACHE_DIR:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+
+def _remember(key: str, timestamp: float, data) -> None:
+    """Put an entry in the in-memory LRU, evicting the least recently used ones."""
+    with _lock:
+        _memory[key] = (timestamp, data)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_SIZE:
+            _memory.popitem(last=False)
 
-def get_cache_path(key: str) -> str:
-    """Get the cache file path for a given key."""
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    return os.path.join(CACHE_DIR, f"{key}.json")
 
-def is_cache_valid(cache_path: str) -> bool:
-    """Check if the cache is still valid."""
-    if not os.path.exists(cache_path):
-        return False
+def _trim(connection: sqlite3.Connection) -> None:
+    """Remove the oldest entries from disk above MAX_ENTRIES."""
+    connection.execute(
+        "DELETE FROM entries WHERE key IN ("
+        "SELECT key FROM entries ORDER BY timestamp DESC LIMIT -1 OFFSET ?)",
+        (MAX_ENTRIES,),
+    )
 
-    with open(cache_path, "r") as f:
-        cache_data = json.load(f)
 
-    return time.time() - cache_data["timestamp"] < CACHE_DURATION
+def get_ttl(namespace: str | None) -> float:
+    """Get the TTL in seconds of a namespace."""
+    return CACHE_TTLS.get(namespace, CACHE_DURATION)
 
-def get_cached_data(key: str) -> dict | None:
+
+def get_full_key(key: str, namespace: str | None) -> str:
+    """Prefix a key with its namespace."""
+    return f"{namespace}_{key}" if namespace else key
+
+
+def _load(hashed: str) -> tuple[float, object] | None:
+    """Get (timestamp, data) for a storage key, from memory first then from disk."""
+    with _lock:
+        entry = _memory.get(hashed)
+        if entry is not None:
+            _memory.move_to_end(hashed)
+            return entry
+
+    row = (
+        _connect()
+        .execute("SELECT timestamp, data FROM entries WHERE key = ?", (hashed,))
+        .fetchone()
+    )
+    if row is None:
+        return None
+    entry = (row[0], json.loads(row[1]))
+    _remember(hashed, *entry)
+    return entry
+
+
+def _store(key: str, data, timestamp: float | None = None) -> None:
+    """Write an entry to disk and memory, a None data being a negative entry."""
+    global _writes
+    hashed = hash_key(key)
+    timestamp = time.time() if timestamp is None else timestamp
+    connection = _connect()
+    connection.execute(
+        "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+        (hashed, normalize_key(key), timestamp, json.dumps(data)),
+    )
+    _remember(hashed, timestamp, data)
+
+    with _lock:
+        _writes += 1
+        trim = _writes % TRIM_EVERY == 0
+    if trim:
+        _trim(connection)
+
+
+def is_cache_valid(timestamp: float, namespace: str | None = None, data=True) -> bool:
+    """Check if an entry written at timestamp is still valid."""
+    ttl = get_ttl(namespace) if data is not None else get_ttl("negative")
+    return time.time() - timestamp < ttl
+
+
+def get_cached_data(key: str, namespace: str | None = None) -> dict | None:
     """Get cached data for a given key."""
-    cache_path = get_cache_path(key)
-    if not is_cache_valid(cache_path):
+    entry = _load(hash_key(get_full_key(key, namespace)))
+    if entry is None:
+        return None
+
+    timestamp, data = entry
+    if not is_cache_valid(timestamp, namespace, data):
         return None
+    return data
 
-    with open(cache_path, "r") as f:
-        return json.load(f)["data"]
 
-def set_cached_data(key: str, data: dict) -> None:
+def set_cached_data(key: str, data: dict, namespace: str | None = None) -> None:
     """Set cached data for a given key."""
-    cache_path = get_cache_path(key)
-    with open(cache_path, "w") as f:
-        json.dump({"timestamp": time.time(), "data": data}, f)
+    _store(get_full_key(key, namespace), data)
+
+
+def get_or_fetch(namespace: str, key: str, fetch: Callable[[], object]):
+    """Get cached data or fetch it, caching misses and revalidating stale data.
+
+    A None result of fetch is cached for the "negative" TTL. Expired data is
+    still returned while fetch runs in the background to replace it. Exceptions
+    raised by fetch are not cached and propagate when nothing can be served.
+    Concurrent misses on the same key share a single fetch.
+
+    Args:
+        namespace (str): Namespace of the key, selects the TTL (e.g.: cover_music)
+        key (str): Key inside the namespace
+        fetch (Callable): Function returning the fresh data, or None if not found
+
+    Returns:
+        The cached or fetched data, None if not found
+    """
+    full_key = get_full_key(key, namespace)
+    entry = _load(hash_key(full_key))
+
+    if entry is not None:
+        timestamp, data = entry
+        if is_cache_valid(timestamp, namespace, data):
+            _count("hits" if data is not None else "negative_hits")
+            return data
+        if data is not None:
+            _count("stale")
+            _revalidate(namespace, full_key, fetch, data)
+            return data
+
+    _count("misses")
+    return _in_flight.do(full_key, _fetch_and_store, full_key, fetch)
+
+
+def _count(stat: str) -> None:
+    with _lock:
+        _stats[stat] += 1
+
+
+def get_cache_stats() -> dict[str, int]:
+    """Get the lookup counters of get_or_fetch and get_identity, for diagnostics.
+
+    Returns:
+        dict: {hits, negative_hits, stale, misses, identity_hits, identity_misses}
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def _fetch_and_store(full_key: str, fetch: Callable[[], object]):
+    """Fetch data and write it to the cache."""
+    data = fetch()
+    _store(full_key, data)
+    return data
+
+
+def _revalidate(namespace: str, full_key: str, fetch: Callable[[], object], stale):
+    """Refresh an expired entry in the background, once at a time per key."""
+    with _lock:
+        if full_key in _refreshing:
+            return
+        _refreshing.add(full_key)
+
+    def refresh():
+        try:
+            data = _in_flight.do(full_key, fetch)
+        except Exception as error:
+            LOGGER.debug(f"Failed to refresh {full_key}: {error}")
+            data = None
+        try:
+            if data is None:
+                # Keep serving the stale data, retry after the negative TTL
+                timestamp = time.time() - get_ttl(namespace) + get_ttl("negative")
+                _store(full_key, stale, timestamp)
+            else:
+                _store(full_key, data)
+        finally:
+            with _lock:
+                _refreshing.discard(full_key)
+
+    _refresher.submit(refresh)
+
+
+def get_identity(provider: str, key: str) -> str | None:
+    """Get a resolved identifier (e.g.: the MBID of an artist), identities never expire.
+
+    Args:
+        provider (str): Kind of identifier (e.g.: musicbrainz_artist)
+        key (str): External id or name it was resolved from, normalized before lookup
+
+    Returns:
+        str: The identifier, None if never resolved
+    """
+    identity = (provider, normalize_key(key))
+    with _lock:
+        value = _identities.get(identity)
+    if value is not None:
+        _count("identity_hits")
+        return value
+
+    row = (
+        _connect()
+        .execute(
+            "SELECT value FROM identities WHERE provider = ? AND key = ?", identity
+        )
+        .fetchone()
+    )
+    if row is None:
+        _count("identity_misses")
+        return None
+    _count("identity_hits")
+    with _lock:
+        _identities[identity] = row[0]
+    return row[0]
+
+
+def set_identity(provider: str, key: str, value: str) -> None:
+    """Store a resolved identifier, see get_identity."""
+    identity = (provider, normalize_key(key))
+    _connect().execute(
+        "INSERT OR REPLACE INTO identities VALUES (?, ?, ?)", (*identity, str(value))
+    )
+    with _lock:
+        _identities[identity] = str(value)
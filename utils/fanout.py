@@ -0,0 +1,248 @@
+import asyncio
+import os
+
+from typing import Callable
+
+from patchedPypresence.exceptions import (
+    DiscordNotFound,
+    PipeClosed,
+    PyPresenceException,
+    ResponseTimeout,
+)
+from patchedPypresence.presence import AioPresence
+from patchedPypresence.utils import iter_ipc_paths
+from utils.logger import setup_logger
+from utils.reconnect import MAX_DELAY, Backoff, IpcWatcher
+
+_NOTHING = object()
+LOGGER = setup_logger(__name__)
+
+
+class DiscordInstance:
+    """Connection to one Discord client, writing the newest presence it was given
+
+    While a write is waiting for its response, newer presences replace each other
+    so that a slow client only ever catches up with the latest one. Only transport
+    failures drop the connection, a presence rejected by the client fails alone.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        presence: AioPresence,
+        on_lost: Callable[["DiscordInstance"], None] | None = None,
+    ):
+        self.path = path
+        self.presence = presence
+        self.on_lost = on_lost
+        self.connected = False
+        self.rejected = _NOTHING  # last presence the client answered with an error
+        self._pending = None
+        self._task: asyncio.Task | None = None
+
+    async def connect(self):
+        await self.presence.connect()
+        self.connected = True
+
+    def submit(self, kwargs: dict | None) -> asyncio.Future:
+        """Queues a presence for this client
+
+        Args:
+            kwargs (dict | None): Arguments of AioPresence.update, None to clear the presence
+
+        Returns:
+            asyncio.Future: Resolved with the response of the client, or None if replaced
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting anymore when a slow client answers
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        if self._pending is not None:
+            self._pending[1].set_result(None)
+        self._pending = (kwargs, future)
+        if self._task is None:
+            self._task = asyncio.create_task(self._write())
+        return future
+
+    def close(self):
+        self.connected = False
+        if self._pending is not None:
+            self._pending[1].set_exception(PipeClosed())
+            self._pending = None
+        self.presence._close_writer()
+
+    async def _write(self):
+        try:
+            while self._pending is not None:
+                kwargs, future = self._pending
+                self._pending = None
+                try:
+                    if kwargs is None:
+                        response = await self.presence.clear()
+                    else:
+                        response = await self.presence.update(**kwargs)
+                except (PipeClosed, ResponseTimeout, OSError) as error:
+                    future.set_exception(error)
+                    self.close()
+                    if self.on_lost is not None:
+                        self.on_lost(self)
+                    return
+                except Exception as error:
+                    # e.g.: a ServerError for a text under 2 characters, the pipe is still fine
+                    self.rejected = kwargs
+                    future.set_exception(error)
+                    continue
+                self.rejected = _NOTHING
+                future.set_result(response)
+        finally:
+            self._task = None
+
+
+class FanoutPresence:
+    """Publishes the presence to every running Discord client (stable, PTB, Canary, flatpak...)
+
+    Each client has its own connection, written concurrently and reconnected
+    independently, an update completes as soon as one client acknowledged it.
+    """
+
+    def __init__(self, client_id: str, **kwargs):
+        self.client_id = client_id
+        self.kwargs = kwargs
+        self.instances: dict[str, DiscordInstance] = {}
+        self._last = _NOTHING
+        self._supervisor: asyncio.Task | None = None
+        self._disconnected = asyncio.Event()
+        self._connecting = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return any(instance.connected for instance in self.instances.values())
+
+    async def connect(self):
+        """Connects to every Discord client not connected yet
+
+        Raises:
+            DiscordNotFound: No Discord client is running
+            PyPresenceException: No Discord client could be connected to
+        """
+        async with self._connecting:
+            await self._connect()
+
+    async def _connect(self):
+        # The client of the last successful handshake comes first
+        paths = list(dict.fromkeys(iter_ipc_paths()))
+        for path in list(self.instances):
+            if path not in paths:
+                self.instances.pop(path).close()
+        if not paths:
+            raise DiscordNotFound
+
+        for path in paths:
+            if path not in self.instances:
+                presence = AioPresence(self.client_id, ipc_path=path, **self.kwargs)
+                self.instances[path] = DiscordInstance(path, presence, self._on_lost)
+        waiting = [
+            instance for instance in self.instances.values() if not instance.connected
+        ]
+        results = await asyncio.gather(
+            *(instance.connect() for instance in waiting), return_exceptions=True
+        )
+        for instance, result in zip(waiting, results):
+            if isinstance(result, Exception):
+                LOGGER.debug(f"Failed to connect to Discord at {instance.path}: {result}")
+            else:
+                LOGGER.info(f"🔌 Connected to Discord at {instance.path}")
+                if self._last is not _NOTHING and self._last is not instance.rejected:
+                    instance.submit(self._last)
+
+        if not self.connected:
+            errors = [result for result in results if isinstance(result, Exception)]
+            raise errors[0] if errors else PipeClosed()
+        if self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._supervise())
+
+    async def update(self, **kwargs):
+        return await self._publish(kwargs)
+
+    async def clear(self, pid: int = os.getpid()):
+        return await self._publish(None)
+
+    def close(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        for instance in self.instances.values():
+            instance.close()
+
+    async def _publish(self, kwargs: dict | None):
+        """Writes to every connected client, returning the first acknowledgement
+
+        Raises:
+            PyPresenceException | OSError: Every client failed, the last error is raised
+        """
+        self._last = kwargs
+        futures = [
+            instance.submit(kwargs)
+            for instance in self.instances.values()
+            if instance.connected
+        ]
+        if not futures:
+            raise PipeClosed
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _on_lost(self, instance: DiscordInstance):
+        LOGGER.warning(f"⚠️ Lost the connection to Discord at {instance.path}")
+        self._disconnected.set()
+
+    async def _supervise(self):
+        """Reconnects lost clients with backoff and picks up clients started later
+
+        A client lost while connected is reconnected right away, but with backoff if it
+        keeps dropping: the backoff only resets after a wait without any loss.
+        """
+        backoff = Backoff()
+        watcher = IpcWatcher()
+        dropped = False  # a client was lost since the backoff last reset
+        try:
+            while True:
+                lost = [
+                    instance.path
+                    for instance in self.instances.values()
+                    if not instance.connected
+                ]
+                timeout = backoff.next() if lost else MAX_DELAY
+                self._disconnected.clear()
+                watch = asyncio.create_task(watcher.wait(timeout))
+                lost_now = asyncio.create_task(self._disconnected.wait())
+                try:
+                    done, _ = await asyncio.wait(
+                        {watch, lost_now}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    # Also when the supervisor itself is cancelled
+                    watch.cancel()
+                    lost_now.cancel()
+                if lost_now in done:
+                    if dropped:
+                        delay = backoff.next()
+                        LOGGER.debug(f"Lost Discord again, reconnecting in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                    dropped = True
+                elif not lost:
+                    backoff.reset()
+                    dropped = False
+                try:
+                    await self.connect()
+                except (PyPresenceException, OSError) as error:
+                    LOGGER.debug(f"No Discord client to reconnect to: {error}")
+        finally:
+            watcher.close()
@@ -0,0 +1,248 @@
+import re
+import threading
+import time
+import warnings
+import requests
+import urllib3
+
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+from utils.logger import setup_logger
+from utils.throttle import CircuitBreaker, TokenBucket
+
+TIMEOUT = (3.05, 10)  # (connect, read) in seconds
+POOL_SIZE = 10
+RETRIES = 2  # attempts after the first one
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled on each following one
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+RETRY_METHODS = ["HEAD", "GET", "OPTIONS"]
+MAX_RETRY_AFTER = 10  # seconds asked by a Retry-After header beyond which the response is returned as is
+LOGGER = setup_logger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a host whose circuit breaker is open"""
+
+_sessions: dict[str, requests.Session] = {}
+_stats: dict[str, dict] = {}
+_limits: dict[str, TokenBucket] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+
+
+def get_host(url: str) -> str:
+    """Returns the scheme and host part of an URL (e.g.: https://musicbrainz.org)"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url: str) -> requests.Session:
+    """Returns the keep-alive session dedicated to the host of an URL
+
+    Args:
+        url (str): Any URL of the host
+
+    Returns:
+        requests.Session: Session with its own connection pool
+    """
+    host = get_host(url)
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            # Retries are left to request(), where each attempt goes through the rate limit
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount(f"{host}/", adapter)
+            _sessions[host] = session
+            _stats[host] = dict(count=0, errors=0, total_ms=0.0, max_ms=0.0, last_ms=0.0)
+    return session
+
+
+def trust_host(url: str):
+    """Disables certificate verification for a host and silences the warnings about it
+
+    Requests to other hosts still warn if they aren't verified.
+
+    Args:
+        url (str): Any URL of the host (e.g.: the Plex server with its self-signed certificate)
+    """
+    get_session(url).verify = False
+    hostname = urlsplit(url).hostname
+    warnings.filterwarnings(
+        "ignore",
+        message=f"Unverified HTTPS request is being made to host '{re.escape(hostname)}'",
+        category=urllib3.exceptions.InsecureRequestWarning,
+    )
+
+
+def set_rate_limit(url: str, rate: float, capacity: float = 1):
+    """Limits the requests sent to a host
+
+    Args:
+        url (str): Any URL of the host
+        rate (float): Requests per second
+        capacity (float, optional): Requests allowed in a burst. Defaults to 1.
+    """
+    with _lock:
+        _limits[get_host(url)] = TokenBucket(rate, capacity)
+
+
+def set_circuit_breaker(url: str, threshold: int = 5, cooldown: float = 60):
+    """Stops calling a host for cooldown seconds after threshold consecutive failures
+
+    Args:
+        url (str): Any URL of the host
+        threshold (int, optional): Consecutive failures or timeouts. Defaults to 5.
+        cooldown (float, optional): Seconds during which calls fail immediately. Defaults to 60.
+    """
+    with _lock:
+        _breakers[get_host(url)] = CircuitBreaker(threshold, cooldown)
+
+
+def request(method: str, url: str, timeout=TIMEOUT, **kwargs) -> requests.Response:
+    """Sends a request through the pooled session of the host
+
+    Idempotent methods are retried with backoff on connection errors and 429/5xx,
+    each attempt being rate limited and counted by the circuit breaker.
+
+    Raises:
+        CircuitOpenError: The host failed too many times recently, it wasn't called
+
+    Args:
+        method (str): HTTP method
+        url (str): URL to call
+        timeout (tuple, optional): (connect, read) timeout. Defaults to TIMEOUT.
+
+    Returns:
+        requests.Response: Response of the host
+    """
+    retries = RETRIES if method.upper() in RETRY_METHODS else 0
+    for attempt in range(retries + 1):
+        try:
+            response = _send(method, url, timeout=timeout, **kwargs)
+        except CircuitOpenError:
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+            delay = RETRY_BACKOFF * 2**attempt
+        else:
+            if attempt == retries or response.status_code not in RETRY_STATUSES:
+                return response
+            retry_after = get_retry_after(response)
+            if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                return response
+            delay = retry_after or RETRY_BACKOFF * 2**attempt
+            response.close()
+        LOGGER.debug(f"Retrying {method} {get_host(url)} in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def get_retry_after(response: requests.Response) -> float | None:
+    """Seconds asked by the Retry-After header of a response, if given in seconds"""
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+
+def _send(method: str, url: str, timeout=TIMEOUT, **kwargs) -> requests.Response:
+    """Sends a single attempt of a request, once the host's breaker and rate limit allow it"""
+    session = get_session(url)
+    host = get_host(url)
+    breaker = _breakers.get(host)
+    if breaker and not breaker.allow():
+        raise CircuitOpenError(f"{host} is unavailable, retrying later")
+
+    limit = _limits.get(host)
+    if limit:
+        waited = limit.acquire()
+        if waited:
+            LOGGER.debug(f"{host} throttled for {waited * 1000:.0f}ms")
+    failed = True
+    start = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=timeout, **kwargs)
+        failed = response.status_code >= 500 or response.status_code == 429
+        return response
+    finally:
+        if breaker:
+            if not failed:
+                if breaker.record_success():
+                    LOGGER.info(f"✔️ {host} is available again")
+            elif breaker.record_failure():
+                LOGGER.warning(
+                    f"⚠️ {host} failed {breaker.consecutive_failures} times in a row, "
+                    f"pausing calls for {breaker.cooldown}s"
+                )
+        elapsed = (time.perf_counter() - start) * 1000
+        with _lock:
+            stats = _stats[host]
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["total_ms"] += elapsed
+            stats["last_ms"] = elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed)
+        LOGGER.debug(f"{method} {host} took {elapsed:.0f}ms")
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def get_latency_stats() -> dict[str, dict]:
+    """Returns request latency per host, for diagnostics
+
+    Returns:
+        dict: {host: {count, errors, avg_ms, max_ms, last_ms}}
+    """
+    with _lock:
+        return {
+            host: dict(
+                count=stats["count"],
+                errors=stats["errors"],
+                avg_ms=stats["total_ms"] / stats["count"] if stats["count"] else 0.0,
+                max_ms=stats["max_ms"],
+                last_ms=stats["last_ms"],
+            )
+            for host, stats in _stats.items()
+        }
+
+
+def log_request_stats():
+    """Logs the request latency and circuit breaker state of every host called so far"""
+    breakers = get_breaker_stats()
+    for host, stats in get_latency_stats().items():
+        if not stats["count"]:
+            continue
+        message = (
+            f"📊 {host}: {stats['count']} requests, {stats['errors']} failed, "
+            f"{stats['avg_ms']:.0f}ms on average, {stats['max_ms']:.0f}ms at most"
+        )
+        breaker = breakers.get(host)
+        if breaker:
+            message += f", circuit {breaker['state']}, {breaker['rejected']} calls skipped"
+        LOGGER.info(message)
+
+
+def get_breaker_stats() -> dict[str, dict]:
+    """Returns the circuit breaker state per host, for diagnostics
+
+    Returns:
+        dict: {host: {state, consecutive_failures, failures, rejected}}
+    """
+    with _lock:
+        return {
+            host: dict(
+                state=breaker.state,
+                consecutive_failures=breaker.consecutive_failures,
+                failures=breaker.failures,
+                rejected=breaker.rejected,
+            )
+            for host, breaker in _breakers.items()
+        }
@@ -0,0 +1,238 @@
+import copy
+import json
+import threading
+import time
+import requests
+import urllib3
+
+from typing import Iterable, Iterator
+
+from utils import plex
+from utils.logger import setup_logger
+
+PLAYBACK_STATES = ["playing", "paused", "buffering", "stopped"]
+RECONNECT_DELAY = 5
+MAX_RECONNECT_DELAY = 300
+STREAM_READ = 8192  # bytes read at most at once from the notification stream
+LOGGER = setup_logger(__name__)
+
+
+def iter_stream_lines(response: requests.Response) -> Iterator[str]:
+    """Yields the lines of a streamed response as soon as each of them arrives
+
+    response.iter_lines() reads fixed size blocks, so a small event of a stream
+    that isn't chunked waits until enough of the next ones have been sent.
+
+    Args:
+        response (requests.Response): Response opened with stream=True
+
+    Yields:
+        str: Decoded lines, without line endings
+    """
+    raw = response.raw
+    if not hasattr(raw, "read1"):
+        # urllib3 older than 2.3, one byte at a time
+        yield from response.iter_lines(chunk_size=1, decode_unicode=True)
+        return
+
+    buffer = b""
+    while True:
+        try:
+            data = raw.read1(STREAM_READ)
+        except urllib3.exceptions.ReadTimeoutError as error:
+            raise requests.exceptions.ConnectionError(error) from error
+        except urllib3.exceptions.ProtocolError as error:
+            raise requests.exceptions.ChunkedEncodingError(error) from error
+        if not data:
+            break
+        *lines, buffer = (buffer + data).split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r").decode("utf-8")
+    if buffer:
+        yield buffer.rstrip(b"\r").decode("utf-8")
+
+
+def parse_event_stream(lines: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """Parses a server-sent events stream into (event, data) tuples
+
+    Args:
+        lines (Iterable[str]): Decoded lines of the stream, without line endings
+
+    Yields:
+        tuple[str, str]: Event name ("message" if not given) and its data
+    """
+    event = "message"
+    data = []
+    for line in lines:
+        if line == "":
+            if data:
+                yield event, "\n".join(data)
+            event = "message"
+            data = []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event = value
+            elif field == "data":
+                data.append(value)
+    if data:
+        yield event, "\n".join(data)
+
+
+def get_play_notifications(events: Iterable[tuple[str, str]]) -> Iterator[dict]:
+    """Extracts the playback notifications from parsed events
+
+    Handles both the eventsource shape ({"PlaySessionStateNotification": {...}})
+    and the websocket shape ({"NotificationContainer": {...}}).
+
+    Args:
+        events (Iterable[tuple[str, str]]): Events as yielded by parse_event_stream
+
+    Yields:
+        dict: PlaySessionStateNotification with at least sessionKey and state
+    """
+    for _, data in events:
+        try:
+            payload = json.loads(data)
+        except ValueError:
+            continue
+        if not isinstance(payload, dict):
+            continue
+        payload = payload.get("NotificationContainer", payload)
+        notifications = payload.get("PlaySessionStateNotification", [])
+        if isinstance(notifications, dict):
+            notifications = [notifications]
+        for notification in notifications:
+            if (
+                "sessionKey" in notification
+                and notification.get("state") in PLAYBACK_STATES
+            ):
+                yield notification
+
+
+class PlexEventSource:
+    """Keeps the current activity up to date from the Plex notification stream
+
+    Session details are only fetched from /status/sessions when a notification
+    concerns a session not seen yet or a new media, progress notifications of the
+    tracked session are applied locally.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self._activity = None
+        self._relevant = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="plex-notifications", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until a notification changes the activity or timeout expires
+
+        Args:
+            timeout (float): Maximum time to wait in seconds
+
+        Returns:
+            bool: True if the activity changed
+        """
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+    def get_activity(self) -> dict | None:
+        """Returns a copy of the current activity, same format as plex.get_my_activity"""
+        with self._lock:
+            return copy.deepcopy(self._activity)
+
+    def refresh(self):
+        """Fetches /status/sessions and re-evaluates every session"""
+        streams = plex.get_activity()["data"]["MediaContainer"].get("Metadata", [])
+        activity = None
+        relevant = {}
+        for stream in streams:
+            mine = plex.is_my_stream(stream)
+            relevant[str(stream["sessionKey"])] = mine
+            if mine and activity is None:
+                activity = stream
+        with self._lock:
+            self._relevant = relevant
+            self._activity = activity
+        self._changed.set()
+
+    def handle(self, notification: dict):
+        """Applies a playback notification to the current activity
+
+        Args:
+            notification (dict): PlaySessionStateNotification
+        """
+        session_key = str(notification["sessionKey"])
+        state = notification["state"]
+
+        with self._lock:
+            activity = self._activity
+            is_current = (
+                activity is not None and str(activity["sessionKey"]) == session_key
+            )
+
+            if state == "stopped":
+                self._relevant.pop(session_key, None)
+                if not is_current:
+                    return
+            elif self._relevant.get(session_key) is False:
+                return
+            elif is_current and str(activity["ratingKey"]) == str(
+                notification.get("ratingKey")
+            ):
+                if state != "buffering":
+                    activity["Player"]["state"] = state
+                activity["viewOffset"] = notification.get(
+                    "viewOffset", activity["viewOffset"]
+                )
+                self._changed.set()
+                return
+            elif activity is not None and not is_current and session_key in self._relevant:
+                # Another session of ours while one is already reported
+                return
+
+        self.refresh()
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            streaming = False
+            try:
+                response = plex.open_notification_stream()
+                self.refresh()
+                if not self.connected:
+                    LOGGER.info("🔔 Listening to Plex notifications")
+                self.connected = True
+                streaming = True
+                delay = RECONNECT_DELAY
+                with response:
+                    lines = iter_stream_lines(response)
+                    for notification in get_play_notifications(parse_event_stream(lines)):
+                        self.handle(notification)
+                LOGGER.warning("⚠️ Plex notification stream closed")
+            except requests.exceptions.ConnectionError as error:
+                if streaming:
+                    # Idle streams hit the read timeout, reconnect right away
+                    LOGGER.debug(f"Plex notification stream interrupted: {error}")
+                    continue
+                LOGGER.warning(
+                    f"⚠️ Plex notification stream unavailable, polling instead: {error}"
+                )
+            except Exception as error:
+                LOGGER.warning(
+                    f"⚠️ Plex notification stream unavailable, polling instead: {error}"
+                )
+            self.connected = False
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
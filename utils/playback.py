@@ -0,0 +1,107 @@
+import time
+
+from enum import Enum
+
+from utils.session import PlaybackSession
+
+DRIFT_THRESHOLD = 10  # seconds between the extrapolated and reported position that aren't a seek
+
+
+class Transition(Enum):
+    STARTED = "started"
+    RESUMED = "resumed"
+    PAUSED = "paused"
+    SEEKED = "seeked"
+    MEDIA_CHANGED = "media-changed"
+    STOPPED = "stopped"
+    UNCHANGED = "unchanged"
+
+
+class Action(Enum):
+    NONE = "none"  # the presence shown is still right
+    PROGRESS = "progress"  # new timestamps or play/pause state, artwork already resolved is kept
+    REBUILD = "rebuild"  # new media, artwork has to be resolved
+    CLEAR = "clear"  # nothing plays anymore
+
+
+TRANSITION_ACTIONS = {
+    Transition.STARTED: Action.REBUILD,
+    Transition.MEDIA_CHANGED: Action.REBUILD,
+    Transition.RESUMED: Action.PROGRESS,
+    Transition.PAUSED: Action.PROGRESS,
+    Transition.SEEKED: Action.PROGRESS,
+    Transition.STOPPED: Action.CLEAR,
+    Transition.UNCHANGED: Action.NONE,
+}
+
+
+class PlaybackTracker:
+    """Follows the reported playback and tells what changed since the last observation
+
+    The position is extrapolated on a monotonic clock from the last one synced,
+    a reported position off by more than drift_threshold is a seek and resyncs it.
+    """
+
+    def __init__(self, drift_threshold: float = DRIFT_THRESHOLD):
+        self.drift_threshold = drift_threshold
+        self.session = None
+        self.key = None
+        self.state = None
+        self.duration = 0.0  # seconds
+        self.offset = 0.0  # seconds, position when last synced
+        self.observed_at = 0.0  # time.monotonic() of the last sync
+
+    def position(self, now: float | None = None) -> float:
+        """Position in seconds the playback should be at now"""
+        if self.state != "playing":
+            return self.offset
+        now = time.monotonic() if now is None else now
+        return self.offset + now - self.observed_at
+
+    def remaining(self, now: float | None = None) -> float:
+        """Seconds left before the media should end, negative if it should have"""
+        return self.duration - self.position(now)
+
+    def observe(self, session: PlaybackSession | None, now: float | None = None) -> Transition:
+        """Records the current activity
+
+        Args:
+            session (PlaybackSession | None): Current activity provided by Plex, None if nothing plays
+            now (float, optional): time.monotonic() of the observation. Defaults to now.
+
+        Returns:
+            Transition: What happened since the previous observation
+        """
+        now = time.monotonic() if now is None else now
+        if session is None:
+            transition = Transition.STOPPED if self.key is not None else Transition.UNCHANGED
+            self.session = None
+            self.key = None
+            self.state = None
+            return transition
+        if session == self.session and session.state != "playing":
+            # Still paused at the same position
+            return Transition.UNCHANGED
+
+        key = session.key
+        state = session.state
+        offset = session.view_offset / 1000
+        duration = session.duration / 1000
+
+        if key != self.key:
+            transition = Transition.STARTED if self.key is None else Transition.MEDIA_CHANGED
+        elif state != self.state:
+            transition = Transition.RESUMED if state == "playing" else Transition.PAUSED
+        elif abs(offset - self.position(now)) > self.drift_threshold:
+            transition = Transition.SEEKED
+        else:
+            transition = Transition.UNCHANGED
+
+        self.session = session
+        self.key = key
+        self.state = state
+        self.duration = duration
+        if transition is not Transition.UNCHANGED or state != "playing":
+            self.offset = offset
+            self.observed_at = now
+        return transition
@@ -1,52 +1,112 @@
 import requests
 import json
-import urllib3
+import time
+
+from typing import Callable
 
 from config import (
     plex_address,
     plex_port,
+    plex_url,
     x_plex_token,
     username,
     libraries,
 )
+from utils import http
+
+PLEX_URL = plex_url or f"https://{plex_address}:{plex_port}"
+NOTIFICATIONS_PATH = "/:/eventsource/notifications"
+
+# Plex servers mostly use self-signed certificates
+http.trust_host(PLEX_URL)
+
+_activity_hooks: list[Callable[[float, int, str], None]] = []
+
+
+def add_activity_hook(hook: Callable[[float, int, str], None]):
+    """Calls hook(timestamp, status_code, body) with every /status/sessions response
+
+    Args:
+        hook (Callable): e.g. a SessionRecorder
+    """
+    _activity_hooks.append(hook)
 
 
-def get_activity(
-    plex_address=plex_address, plex_port=plex_port, x_plex_token=x_plex_token
-):
+def get_activity(x_plex_token=x_plex_token):
     headers = {"accept": "application/json"}
-    with urllib3.warnings.catch_warnings():
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        r = requests.get(
-            f"https://{plex_address}:{plex_port}/status/sessions?X-Plex-Token={x_plex_token}",
-            headers=headers,
-            verify=False,
-        )
+    r = http.get(
+        f"{PLEX_URL}/status/sessions?X-Plex-Token={x_plex_token}",
+        headers=headers,
+    )
+    for hook in _activity_hooks:
+        hook(time.time(), r.status_code, r.text)
     return dict(data=json.loads(r.text), code=r.status_code)
 
 
-def get_my_activity(username=username, libraries=libraries):
-    data = get_activity()["data"]
+def is_my_stream(stream: dict, username=username, libraries=libraries) -> bool:
+    """Checks if a session belongs to the configured user and libraries
+
+    Args:
+        stream (dict): A session as listed in /status/sessions
+
+    Returns:
+        bool: True if the session should be reported on Discord
+    """
+    return (len(libraries) == 0 or stream["librarySectionTitle"] in libraries) and (
+        username == "" or stream["User"]["title"] == username
+    )
+
+
+def find_my_stream(data: dict, username=username, libraries=libraries) -> dict | None:
+    """Returns the first session of a /status/sessions document matching the config
+
+    Args:
+        data (dict): Parsed /status/sessions response
+
+    Returns:
+        dict: The matching session or None
+    """
     for stream in data["MediaContainer"].get("Metadata", {}):
-        if (len(libraries) == 0 or stream["librarySectionTitle"] in libraries) and (
-            username == "" or stream["User"]["title"] == username
-        ):
+        if is_my_stream(stream, username=username, libraries=libraries):
             # print(json.dumps(stream, indent=4))
             return stream
     return None
 
 
+def get_my_activity(username=username, libraries=libraries):
+    return find_my_stream(
+        get_activity()["data"], username=username, libraries=libraries
+    )
+
+
+def open_notification_stream(read_timeout: float = 90) -> requests.Response:
+    """Opens the Plex server-sent events stream filtered on playback notifications
+
+    Args:
+        read_timeout (float): Seconds without any data before the stream is considered dead
+
+    Returns:
+        requests.Response: Streamed response, iterate over its lines to get the events
+    """
+    headers = {"accept": "text/event-stream"}
+    r = http.get(
+        f"{PLEX_URL}{NOTIFICATIONS_PATH}?filters=playing&X-Plex-Token={x_plex_token}",
+        headers=headers,
+        stream=True,
+        timeout=(http.TIMEOUT[0], read_timeout),
+    )
+    r.raise_for_status()
+    return r
+
+
 def get_metadata(plex_item_id=None) -> dict:
     if plex_item_id:
         headers = {"accept": "application/json"}
-        with urllib3.warnings.catch_warnings():
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            r = requests.get(
-                f"https://{plex_address}:{plex_port}/library/metadata/{plex_item_id}?X-Plex-Token={x_plex_token}",
-                headers=headers,
-                verify=False,
-            )
-            return json.loads(r.text)
+        r = http.get(
+            f"{PLEX_URL}/library/metadata/{plex_item_id}?X-Plex-Token={x_plex_token}",
+            headers=headers,
+        )
+        return json.loads(r.text)
     return {}
 
 
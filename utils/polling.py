@@ -0,0 +1,56 @@
+from utils.playback import PlaybackTracker, Transition
+
+IDLE_POLL = 10  # seconds between Plex polls right after the playback stopped
+IDLE_MAX_POLL = 120  # seconds between Plex polls at most when nothing plays
+PAUSED_POLL = 15  # seconds between Plex polls when paused or buffering
+CHANGE_POLL = 5  # seconds before confirming a change, they come in bursts (skips, seeks)
+END_WINDOW = 10  # seconds before the predicted end of the media when polling gets dense
+END_POLL = 2  # seconds between Plex polls around the predicted end of the media
+
+
+class PollScheduler:
+    """Picks the delay before the next Plex poll from the playback state
+
+    Polls sparsely while paused, with an exponential backoff while nothing plays,
+    densely around the predicted end of the media, where the next item starts, and
+    at poll_interval otherwise since the position is extrapolated in between.
+    Any change starts over from the shortest delays.
+    """
+
+    def __init__(self, poll_interval: float, idle_max: float = IDLE_MAX_POLL):
+        """
+        Args:
+            poll_interval (float): Seconds between Plex polls while playing
+            idle_max (float, optional): Ceiling of the idle backoff. Defaults to IDLE_MAX_POLL.
+        """
+        self.poll_interval = poll_interval
+        self.idle_max = idle_max
+        self.idle_polls = 0
+
+    def next_delay(self, tracker: PlaybackTracker, transition: Transition) -> float:
+        """Returns the seconds to wait before polling Plex again
+
+        Args:
+            tracker (PlaybackTracker): Playback followed so far
+            transition (Transition): What the last poll revealed
+        """
+        if transition is not Transition.UNCHANGED or tracker.key is not None:
+            self.idle_polls = 0
+        if tracker.key is None:
+            delay = min(self.idle_max, IDLE_POLL * 2**self.idle_polls)
+            if delay < self.idle_max:
+                self.idle_polls += 1
+            return delay
+
+        if tracker.state != "playing":
+            delay = PAUSED_POLL
+        else:
+            remaining = tracker.remaining()
+            if remaining <= END_WINDOW:
+                delay = END_POLL
+            else:
+                # Wake up when entering the end window
+                delay = min(self.poll_interval, remaining - END_WINDOW)
+        if transition is not Transition.UNCHANGED:
+            delay = min(delay, CHANGE_POLL)
+        return max(END_POLL, delay)
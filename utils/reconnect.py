@@ -0,0 +1,164 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import random
+import struct
+import sys
+
+from patchedPypresence.utils import IPC_PREFIX, get_ipc_dirs
+from utils.logger import setup_logger
+
+BASE_DELAY = 1  # seconds before the first retry
+MAX_DELAY = 60  # seconds between two retries at most
+POLL_INTERVAL = 1  # seconds between two checks of the IPC directories without inotify
+SOCKET_SETTLE = 0.1  # seconds between the socket appearing and Discord listening on it
+
+# inotify(7) flags and event header
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+LOGGER = setup_logger(__name__)
+
+
+class Backoff:
+    """Capped exponential backoff with jitter, so that retries spread out over time"""
+
+    def __init__(self, base: float = BASE_DELAY, cap: float = MAX_DELAY):
+        """
+        Args:
+            base (float, optional): First delay in seconds. Defaults to BASE_DELAY.
+            cap (float, optional): Maximum delay in seconds. Defaults to MAX_DELAY.
+        """
+        self.base = base
+        self.cap = cap
+        self.attempts = 0
+
+    def next(self) -> float:
+        """Returns the delay before the next retry, between half and all of the exponential delay"""
+        delay = min(self.cap, self.base * 2**self.attempts)
+        self.attempts += 1
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class IpcWatcher:
+    """Wakes up when a Discord IPC socket appears in one of the directories Discord uses
+
+    Relies on inotify on Linux, falls back on checking the modification time of the
+    directories elsewhere, which is still much cheaper than listing them.
+    """
+
+    def __init__(self):
+        self._dirs = get_ipc_dirs() if sys.platform != "win32" else []
+        self._fd = None
+        self._watches = {}
+        self._libc = None
+        self._appeared = asyncio.Event()
+        if sys.platform == "linux":
+            try:
+                self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            except (OSError, AttributeError):
+                fd = -1
+            if fd >= 0:
+                self._fd = fd
+                asyncio.get_running_loop().add_reader(fd, self._read_events)
+            else:
+                LOGGER.debug("inotify unavailable, polling the Discord IPC directories")
+
+    async def wait(self, timeout: float) -> bool:
+        """Waits until a Discord IPC socket appears or timeout expires
+
+        Args:
+            timeout (float): Maximum time to wait in seconds
+
+        Returns:
+            bool: True if a socket appeared
+        """
+        self._appeared.clear()
+        if self._fd is not None:
+            self._add_watches()
+            waiter = self._appeared.wait()
+        elif self._dirs:
+            waiter = self._poll()
+        else:
+            await asyncio.sleep(timeout)
+            return False
+
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        await asyncio.sleep(SOCKET_SETTLE)
+        return True
+
+    def close(self):
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def _add_watches(self):
+        """Watches the IPC directories, and the parents of those not created yet"""
+        for path in self._dirs:
+            while not os.path.isdir(path) and os.path.dirname(path) != path:
+                path = os.path.dirname(path)
+            if path in self._watches.values():
+                continue
+            wd = self._libc.inotify_add_watch(
+                self._fd, path.encode(), IN_CREATE | IN_MOVED_TO | IN_ATTRIB
+            )
+            if wd >= 0:
+                self._watches[wd] = path
+                if self._has_socket(path):
+                    # Created before the watch, e.g. along with its directory
+                    self._appeared.set()
+
+    @staticmethod
+    def _has_socket(path: str) -> bool:
+        try:
+            return any(name.startswith(IPC_PREFIX) for name in os.listdir(path))
+        except OSError:
+            return False
+
+    def _read_events(self):
+        try:
+            buffer = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = buffer[offset : offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & IN_ISDIR:
+                # e.g. the flatpak directory was just created, watch inside it
+                self._add_watches()
+            elif name.startswith(IPC_PREFIX):
+                self._appeared.set()
+
+    async def _poll(self):
+        mtimes = self._get_mtimes()
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            current = self._get_mtimes()
+            if current != mtimes:
+                return
+            mtimes = current
+
+    def _get_mtimes(self) -> list:
+        mtimes = []
+        for path in self._dirs:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
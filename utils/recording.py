@@ -0,0 +1,67 @@
+import gzip
+import json
+import threading
+
+from typing import Iterator
+
+from utils.logger import setup_logger
+
+RECORDING_VERSION = 1
+LOGGER = setup_logger(__name__)
+
+
+class SessionRecorder:
+    """Appends the /status/sessions responses to a gzipped JSON lines file
+
+    Each line is {"t": timestamp, "code": status, "body": raw response}, the body
+    being left out when identical to the previous one. Use it as a plex activity hook.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._last_body = None
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._write({"version": RECORDING_VERSION})
+        LOGGER.info(f"⏺️ Recording Plex sessions to {path}")
+
+    def __call__(self, timestamp: float, code: int, body: str):
+        record = {"t": round(timestamp, 3), "code": code}
+        with self._lock:
+            if body != self._last_body:
+                record["body"] = body
+                self._last_body = body
+            self._write(record)
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        # Keep the file readable if the script is killed
+        self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_recording(path: str) -> Iterator[tuple[float, int, str]]:
+    """Reads a file written by SessionRecorder
+
+    Args:
+        path (str): Path of the recording
+
+    Yields:
+        tuple[float, int, str]: Timestamp, status code and raw body of each response
+    """
+    body = None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                record = json.loads(line)
+                if "t" not in record:
+                    # Header, a new one is written each time the recording is resumed
+                    continue
+                body = record.get("body", body)
+                yield record["t"], record["code"], body
+        except (EOFError, ValueError):
+            # Recording interrupted while writing
+            return
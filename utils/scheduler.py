@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+from collections import deque
+
+RATE_LIMIT = 5  # activity updates accepted by Discord...
+RATE_WINDOW = 20  # ...per this many seconds
+TIMESTAMP_TOLERANCE = 2  # seconds of start/end jitter that doesn't deserve an update
+TIMESTAMP_FIELDS = ["start", "end"]
+_NOTHING_SENT = object()
+
+
+def normalize_payload(to_send: dict | None) -> dict | None:
+    """Drops empty fields and casts timestamps the way Payload.set_activity does
+
+    Args:
+        to_send (dict | None): Informations to send to discord RPC, None for a clear
+
+    Returns:
+        dict | None: Comparable payload
+    """
+    if to_send is None:
+        return None
+    payload = {key: value for key, value in to_send.items() if value is not None}
+    for field in TIMESTAMP_FIELDS:
+        if field in payload:
+            payload[field] = int(payload[field])
+    return payload
+
+
+def is_timestamp_nudge(to_send: dict | None, last_sent: dict | None) -> bool:
+    """Tells if two payloads only differ by their timestamps
+
+    Args:
+        to_send (dict | None): Normalized payload to send
+        last_sent (dict | None): Normalized payload sent last
+
+    Returns:
+        bool: True if everything but start/end is the same
+    """
+    if to_send is None or last_sent is None:
+        return to_send is last_sent
+    return _without_timestamps(to_send) == _without_timestamps(last_sent)
+
+
+def _without_timestamps(payload: dict) -> dict:
+    return {key: value for key, value in payload.items() if key not in TIMESTAMP_FIELDS}
+
+
+def is_same_payload(to_send: dict | None, last_sent: dict | None) -> bool:
+    """Tells if sending a payload again would change nothing visible
+
+    Args:
+        to_send (dict | None): Normalized payload to send
+        last_sent (dict | None): Normalized payload sent last
+
+    Returns:
+        bool: True if only timestamps differ, by less than TIMESTAMP_TOLERANCE
+    """
+    if not is_timestamp_nudge(to_send, last_sent):
+        return False
+    if to_send is None:
+        return True
+    return all(
+        (field in to_send) == (field in last_sent)
+        and abs(to_send.get(field, 0) - last_sent.get(field, 0)) <= TIMESTAMP_TOLERANCE
+        for field in TIMESTAMP_FIELDS
+    )
+
+
+class PresenceScheduler:
+    """Sits between the pipeline and Discord: skips no-op updates, keeps the newest
+    payload of a burst and paces writes to Discord's rate limit.
+
+    Timestamp only updates never use the last slot of the rate window, so that a new
+    media, a play/pause or a clear can always go out without waiting behind them.
+    """
+
+    def __init__(self, limit: int = RATE_LIMIT, window: float = RATE_WINDOW):
+        self.limit = limit
+        self.window = window
+        self.skipped = 0
+        self.coalesced = 0
+        self._pending = None
+        self._has_pending = False
+        self._last_sent = _NOTHING_SENT
+        self._sent_times = deque()
+        self._changed = asyncio.Event()
+
+    def submit(self, to_send: dict | None):
+        """Queues a presence, replacing the one not written yet if any
+
+        Args:
+            to_send (dict | None): Informations to send to discord RPC, None to clear the presence
+        """
+        if self._has_pending:
+            self.coalesced += 1
+        self._pending = normalize_payload(to_send)
+        self._has_pending = True
+        self._changed.set()
+
+    def retry(self, to_send: dict | None):
+        """Queues a presence that failed to be written, unless a newer one is queued
+
+        Args:
+            to_send (dict | None): The presence that failed
+        """
+        self._last_sent = _NOTHING_SENT
+        if not self._has_pending:
+            self.submit(to_send)
+
+    def reset(self):
+        """Forgets what was sent, e.g. after a reconnection the next presence is always written"""
+        self._last_sent = _NOTHING_SENT
+
+    def sent(self, to_send: dict | None):
+        """Records a presence written successfully
+
+        Args:
+            to_send (dict | None): The presence returned by next
+        """
+        self._last_sent = to_send
+
+    async def next(self) -> dict | None:
+        """Waits for the next presence that should be written now
+
+        Returns:
+            dict | None: Informations to send to discord RPC, None to clear the presence
+        """
+        while True:
+            if not self._has_pending:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            to_send = self._pending
+            if self._last_sent is not _NOTHING_SENT and is_same_payload(
+                to_send, self._last_sent
+            ):
+                self._has_pending = False
+                self.skipped += 1
+                continue
+
+            nudge = (
+                self._last_sent is not _NOTHING_SENT
+                and is_timestamp_nudge(to_send, self._last_sent)
+            )
+            delay = self._get_delay(max(1, self.limit - 1) if nudge else self.limit)
+            if delay > 0:
+                # A newer presence may come in meanwhile, it is evaluated instead
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._has_pending = False
+            self._sent_times.append(time.monotonic())
+            return to_send
+
+    def _get_delay(self, slots: int) -> float:
+        """Seconds before a write fits in the rate window using at most slots writes"""
+        now = time.monotonic()
+        while self._sent_times and now - self._sent_times[0] >= self.window:
+            self._sent_times.popleft()
+        if len(self._sent_times) < slots:
+            return 0.0
+        return self._sent_times[len(self._sent_times) - slots] + self.window - now
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class PlaybackSession:
+    """The fields of a Plex session the presence is made of, parsed once per poll
+
+    Frozen so that it's hashable and cheap to compare to the previous poll.
+    Times are in milliseconds, as reported by Plex.
+    """
+
+    session_key: str
+    rating_key: str
+    machine_identifier: str
+    type: str
+    state: str
+    title: str
+    view_offset: int = 0
+    duration: int = 0
+    parent_title: str = ""
+    grandparent_title: str = ""
+    grandparent_rating_key: str = ""
+    parent_index: int | None = None
+    index: int | None = None
+    year: int | None = None
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        """Identifies the playback: the same media in the same session on the same player"""
+        return (self.session_key, self.rating_key, self.machine_identifier)
+
+    @classmethod
+    def from_plex(cls, metadata: dict) -> "PlaybackSession":
+        """Parses a session as listed in /status/sessions
+
+        Args:
+            metadata (dict): Entry of MediaContainer.Metadata
+
+        Returns:
+            PlaybackSession: The parsed session
+        """
+        player = metadata["Player"]
+        return cls(
+            session_key=str(metadata.get("sessionKey")),
+            rating_key=str(metadata.get("ratingKey")),
+            machine_identifier=str(player.get("machineIdentifier")),
+            type=metadata["type"],
+            state=player["state"],
+            title=metadata["title"],
+            view_offset=int(metadata.get("viewOffset", 0)),
+            duration=int(metadata.get("duration", 0)),
+            parent_title=metadata.get("parentTitle", ""),
+            grandparent_title=metadata.get("grandparentTitle", ""),
+            grandparent_rating_key=str(metadata.get("grandparentRatingKey", "")),
+            parent_index=metadata.get("parentIndex"),
+            index=metadata.get("index"),
+            year=metadata.get("year"),
+        )
@@ -0,0 +1,147 @@
+import threading
+import time
+
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+
+class TokenBucket:
+    """Token bucket rate limiter, acquire blocks until a token is available"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        Args:
+            rate (float): Tokens added per second
+            capacity (float, optional): Maximum burst. Defaults to 1.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes a token, waiting for it if needed
+
+        Returns:
+            float: Time waited in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Reserve the token now, waiters queue up behind each other
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class SingleFlight:
+    """Coalesces concurrent calls sharing a key into a single call"""
+
+    def __init__(self):
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable, *args, **kwargs):
+        """Calls function, or waits for the result of the call already running for key
+
+        Args:
+            key (Hashable): Identifies calls that would return the same result
+            function (Callable): Function to call
+
+        Returns:
+            The result of the function, exceptions are shared as well
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while after consecutive failures"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60):
+        """
+        Args:
+            threshold (int, optional): Consecutive failures opening the circuit. Defaults to 5.
+            cooldown (float, optional): Seconds before a trial call is allowed. Defaults to 60.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Tells if a call can go through, only one trial call is let through when half-open"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                return True
+            if self.state == self.HALF_OPEN:
+                self.rejected += 1
+                return False
+            return True
+
+    def record_success(self) -> bool:
+        """Closes the circuit
+
+        Returns:
+            bool: True if the circuit was not closed before
+        """
+        with self._lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            return recovered
+
+    def record_failure(self) -> bool:
+        """Counts a failure, opening the circuit above the threshold or after a failed trial
+
+        Returns:
+            bool: True if the circuit just opened
+        """
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED
+                and self.consecutive_failures >= self.threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
@@ -0,0 +1,52 @@
+import heapq
+import itertools
+import time
+
+
+class TimerQueue:
+    """Named one-shot timers on the monotonic clock, kept in a heap
+
+    Scheduling a name again replaces its timer. Cancelled and replaced timers stay
+    in the heap until they reach the top, where they are dropped.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, str]] = []
+        self._deadlines: dict[str, float] = {}
+        self._counter = itertools.count()
+
+    def schedule(self, name: str, delay: float):
+        """Fires name in delay seconds, replacing the timer of the same name if any"""
+        deadline = time.monotonic() + delay
+        self._deadlines[name] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), name))
+
+    def cancel(self, *names: str):
+        for name in names:
+            self._deadlines.pop(name, None)
+
+    def _drop_stale(self):
+        while self._heap:
+            deadline, _, name = self._heap[0]
+            if self._deadlines.get(name) == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def timeout(self) -> float | None:
+        """Seconds until the next timer fires, None if none is scheduled"""
+        self._drop_stale()
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def pop_due(self) -> list[str]:
+        """Removes and returns the names of the timers due, earliest first"""
+        now = time.monotonic()
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, name = heapq.heappop(self._heap)
+            del self._deadlines[name]
+            due.append(name)
+            self._drop_stale()
+        return due